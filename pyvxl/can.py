@@ -5,12 +5,13 @@
 import logging
 import atexit
 from os import path, remove
-from queue import Queue
+from collections import deque
 from time import localtime, sleep, perf_counter
 from threading import Thread, Lock, BoundedSemaphore, Condition
 # TODO: Look into adding a condition for pausing the main thread while
 #       waiting for received messages.
 from math import gcd
+from functools import reduce
 from pyvxl.vxl import VxlCan
 from pyvxl.uds import UDS
 from pyvxl.can_types import Database
@@ -101,56 +102,35 @@ class CAN:
             channel.stop_all_messages()
 
     def print_periodics(self, info=False, search_for=''):
-        """Print all periodic messages currently being sent."""
-        raise NotImplementedError
-        # if search_for:
-        #     # pylint: disable=W0612
-        #     (status, msgID) = self._checkMsgID(search_for)
-        #     if not status:
-        #         return False
-        #     elif status == 1:  # searching periodics by id
-        #         for periodic in self.currentPeriodics:
-        #             if periodic.id == msgID:
-        #                 self.last_found_msg = periodic
-        #                 self._print_msg(periodic)
-        #                 for sig in periodic.signals:
-        #                     self.last_found_sig = sig
-        #                     self._print_sig(sig, value=True)
-        #     else:  # searching by string or printing all
-        #         found = False
-        #         msgID = msgID.lower()
-        #         for msg in self.currentPeriodics:
-        #             if search_for.lower() in msg.name.lower():
-        #                 found = True
-        #                 self.last_found_msg = msg
-        #                 self._print_msg(msg)
-        #                 for sig in msg.signals:
-        #                     self.last_found_sig = sig
-        #                     self._print_sig(sig, value=True)
-        #             else:
-        #                 msgPrinted = False
-        #                 for sig in msg.signals:
-        #                     short_name = (msgID in sig.name.lower())
-        #                     full_name = (msgID in sig.long_name.lower())
-        #                     if full_name or short_name:
-        #                         found = True
-        #                         if not msgPrinted:
-        #                             self.last_found_msg = msg
-        #                             self._print_msg(msg)
-        #                             msgPrinted = True
-        #                         self.last_found_sig = sig
-        #                         self._print_sig(sig, value=True)
-        #         if not found:
-        #             logger.error(
-        #                 'Unable to find a periodic message with that string!')
-        # else:
-        #     for msg in self.currentPeriodics:
-        #         self.last_found_msg = msg
-        #         self._print_msg(msg)
-        #         if info:
-        #             for sig in msg.signals:
-        #                 self.last_found_sig = sig
-        #                 self._print_sig(sig, value=True)
+        """Print all periodic messages currently being sent.
+
+        Args:
+            info: If True, the signals of each message are printed as well.
+            search_for: Only print messages with this id or whose name, or
+                        the name of one of its signals, contains this
+                        string.
+        Returns:
+            A list of the printed messages.
+        """
+        periodics = []
+        for channel in self.__channels.values():
+            db = channel.db
+            # Keyed by id so a message matching by name and signal is only
+            # printed once
+            matches = {msg.id: msg for msg in db.find_messages(search_for)}
+            if search_for and isinstance(search_for, str):
+                for sig in db.find_signals(search_for):
+                    matches.setdefault(sig.msg.id, sig.msg)
+            for msg in matches.values():
+                if msg.sending:
+                    periodics.append(msg)
+                    msg.pprint()
+                    if info:
+                        for sig in msg.signals:
+                            sig.pprint(value=True)
+        if search_for and not periodics:
+            logger.info(f'No periodic messages found for {search_for}')
+        return periodics
 
 
 class Channel:
@@ -205,10 +185,12 @@ class Channel:
         """
         if msg.update_func is not None:
             msg.data = msg.update_func(msg)
-        self.__vxl.send(self.channel, msg.id, msg.data, msg.brs)
+        self.__vxl.send(self.channel, msg.id, msg.raw_data, msg.brs)
         if not send_once and msg.period:
             self.__tx_thread.add(self.channel, msg)
-        logger.info(f'{self.name[:8]: ^8} TX: {msg.id: >8X} {msg.data: <16}')
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(f'{self.name[:8]: ^8} TX: {msg.id: >8X} '
+                        f'{msg.data: <16}')
 
     def send_message(self, name_or_id, data=None, period=None, send_once=False):
         """Send a message by name or id."""
@@ -260,49 +242,26 @@ class Channel:
 
     def wait_for_no_error(self, timeout=0):
         """Block until a non error frame is received."""
-        no_error = False
         # Set the error state so this function doesn't return immediately based
         # on a previously received non error frame.
         self.__rx_thread.set_error_state(self.channel, True)
-        if not timeout:
-            # Wait as long as necessary if there isn't a timeout set
-            while self.__rx_thread.get_error_state(self.channel):
-                sleep(0.001)
-            no_error = True
-        else:
-            start = perf_counter()
-            timeout = float(timeout) / 1000.0
-            while (perf_counter() - start) < timeout:
-                if not self.__rx_thread.get_error_state(self.channel):
-                    no_error = True
-                    break
-                sleep(0.001)
-
-        return no_error
+        # Wait as long as necessary if there isn't a timeout set
+        timeout = float(timeout) / 1000.0 if timeout else None
+        return self.__rx_thread.wait_for_error_state(self.channel, False,
+                                                     timeout)
 
     def wait_for_error(self, timeout=0, flush=False):
         """Block until an error frame is received."""
-        error = False
         # Clear the error state so this function doesn't return immediately
         # based on a previously received error frame.
         self.__rx_thread.set_error_state(self.channel, False)
         if flush:
             self.__vxl.flush_queues()
 
-        if not timeout:
-            # Wait as long as necessary if there isn't a timeout set
-            while not self.__rx_thread.get_error_state(self.channel):
-                sleep(0.001)
-            error = True
-        else:
-            start = perf_counter()
-            timeout = float(timeout) / 1000.0
-            while (perf_counter() - start) < timeout:
-                if self.__rx_thread.get_error_state(self.channel):
-                    error = True
-                    break
-                sleep(0.001)
-
+        # Wait as long as necessary if there isn't a timeout set
+        timeout = float(timeout) / 1000.0 if timeout else None
+        error = self.__rx_thread.wait_for_error_state(self.channel, True,
+                                                      timeout)
         if error:
             # As long as there are no other connections (e.g. CANoe) to this
             # channel of the vector hardware, this will clear the error
@@ -325,6 +284,7 @@ class Channel:
         """Start queuing received messages matching name_or_msg_id.
 
         If a queue is already started, it will be replaced with this new one.
+        A queue_size of 0 or less doesn't limit the queue, like queue.Queue.
         """
         msg = self.db.get_message(name_or_msg_id)
         self.__rx_thread.start_queue(self.channel, msg.id, queue_size)
@@ -348,11 +308,13 @@ class Channel:
         msg = self.db.get_message(name_or_msg_id)
         rx_time, data = self.__rx_thread.dequeue_msg(self.channel, msg.id,
                                                      timeout)
-        if data is not None:
-            logger.info(f'{self.name[:8]: ^8} RX: {msg.id: >8X} {data: <16}')
-        else:
-            logger.info(f'{self.name[:8]: ^8} RX timeout: {msg.id: >8X} was '
-                         f'not received after {timeout} milliseconds')
+        if logger.isEnabledFor(logging.INFO):
+            name = self.name[:8]
+            if data is not None:
+                logger.info(f'{name: ^8} RX: {msg.id: >8X} {data: <16}')
+            else:
+                logger.info(f'{name: ^8} RX timeout: {msg.id: >8X} was not '
+                            f'received after {timeout} milliseconds')
         return rx_time, data
 
     def send_recv(self, tx_id, tx_data, rx_id, timeout=1000, queue_size=1000):
@@ -386,13 +348,17 @@ class ReceiveThread(Thread):
         # This lock helps synchronize mutable types that are modified by both
         # threads.
         self.__lock = Lock()
+        # Notified when a channel's error state changes
+        self.__error_state_changed = Condition(self.__lock)
         self.__time = 0
         self.__sleep_time = 0.1
         self.__log_path = ''
         self.__log_file = None
         self.__log_errors = False
         self.__delete_log = False
-        self.__log_request = Queue()
+        self.__log_request = None
+        # Notified when the thread has handled a log request
+        self.__log_request_done = Condition(self.__lock)
         self.__msg_queues = {}
 
         self.__bus_status = {}
@@ -400,7 +366,9 @@ class ReceiveThread(Thread):
         # Check for channel changes once per second and raise an error.
         # The vxlAPI.dll does not properly handle changes to the number of
         # channels after connecting to the dll.
-        self.__init_channels = self.__vxl.get_can_channels(True)
+        # The driver was opened when the VxlCan was created; reading the
+        # config again is enough.
+        self.__init_channels = self.__vxl.get_can_channels(True, reopen=False)
         atexit.register(self.stop)
 
     def run(self):
@@ -413,7 +381,10 @@ class ReceiveThread(Thread):
         XL_CAN_EV_TAG_TX_OK = 0x0404  # noqa
         XL_CAN_EV_TAG_CHIP_STATE = 0x0409  # noqa
         XL_SYNC_PULSE = 0x000B  # noqa
+        # Payload length in bytes indexed by the CAN FD dlc code
+        dlc_lengths = (0, 1, 2, 3, 4, 5, 6, 7, 8, 12, 16, 20, 24, 32, 48, 64)
         log_msgs = self.__pending_msgs
+        last_flush = perf_counter()
         while True:
             sleep(self.__sleep_time)
             # Only modify the log file from the Thread
@@ -436,7 +407,7 @@ class ReceiveThread(Thread):
                 # Check if the main thread is waiting on a received message
                 if self.__wait_args is not None:
                     chan, msg_id, end_time = self.__wait_args
-                    queued = self.__msg_queues[chan][msg_id].qsize()
+                    queued = len(self.__msg_queues[chan][msg_id])
                     if time > end_time or queued:
                         # The timeout has expired; wake up the main thread
                         self.__wait_args = None
@@ -449,28 +420,26 @@ class ReceiveThread(Thread):
                     # rx_event.tagData.canRxOkMsg.msgFlags
                     # rx_event.tagData.canRxOkMsg.crc
                     # rx_event.tagData.canRxOkMsg.totalBitCnt
-                    msg_id = rx_event.tagData.canRxOkMsg.canId
-                    dlc = rx_event.tagData.canRxOkMsg.dlc
-                    rx_data = rx_event.tagData.canRxOkMsg.data
-                    dlc_map = {9: 12, 10: 16, 11: 20, 12: 24, 13: 32, 14: 48,
-                               15: 64}
-                    dlc = dlc_map[dlc] if dlc in dlc_map else dlc
-                    # Convert rx_data from a ctypes 64 byte array to a string
-                    data = ''
-                    for i, byte in enumerate(rx_data):
-                        if i >= dlc:
-                            break
-                        elif i > 0:
-                            data += f' {byte:02X}'
-                        else:
-                            data += f'{byte:02X}'
                     # Strip the extended message ID bit
-                    msg_id &= 0x1FFFFFFF
+                    msg_id = rx_event.tagData.canRxOkMsg.canId & 0x1FFFFFFF
+                    rx_ok = rx_event.tag == XL_CAN_EV_TAG_RX_OK
+                    queued = (rx_ok and
+                              msg_id in self.__msg_queues.get(channel, ()))
+                    log = self.__log_file is not None
+                    # Only decode the data when something will consume it
+                    if not queued and not log:
+                        rx_event = self.__receive()
+                        continue
+                    dlc = dlc_lengths[rx_event.tagData.canRxOkMsg.dlc]
+                    rx_data = bytes(rx_event.tagData.canRxOkMsg.data[:dlc])
                     txrx = 'Tx'
-                    if rx_event.tag == XL_CAN_EV_TAG_RX_OK:
+                    if rx_ok:
                         txrx = 'Rx'
-                        self.__enqueue_msg(time, channel, msg_id, data)
-                    if self.__log_file is not None:
+                        if queued:
+                            self.__enqueue_msg(time, channel, msg_id,
+                                               rx_data.hex().upper())
+                    if log:
+                        data = rx_data.hex(' ').upper()
                         if msg_id > 0x7FF:
                             msg_id = f'{msg_id:X}x'
                         else:
@@ -521,8 +490,13 @@ class ReceiveThread(Thread):
             # that writes to a file are slightly delayed.
             if self.__log_file is not None and log_msgs:
                 self.__log_file.writelines(log_msgs)
-                self.__log_file.flush()
                 log_msgs.clear()
+                # The file is buffered; only push it to disk periodically
+                # instead of after every receive burst.
+                now = perf_counter()
+                if now - last_flush >= 1:
+                    self.__log_file.flush()
+                    last_flush = now
         if self.__log_file is not None and log_msgs:
             self.__log_file.writelines(log_msgs)
             self.__stop_logging()
@@ -553,7 +527,9 @@ class ReceiveThread(Thread):
                     except AssertionError:
                         # This sometimes fails while the thread is shutting down
                         pass
-                data = self.__vxl.receive()
+                # The event is reused; run copies what it needs before
+                # receiving again
+                data = self.__vxl._receive_shared()
             else:
                 data = None
         return data
@@ -592,7 +568,10 @@ class ReceiveThread(Thread):
         """Set the error state of a channel."""
         with self.__lock:
             if channel in self.__bus_status:
-                self.__bus_status[channel]['error_state'] = error_state
+                status = self.__bus_status[channel]
+                if status['error_state'] != error_state:
+                    status['error_state'] = error_state
+                    self.__error_state_changed.notify_all()
 
     def get_error_state(self, channel):
         """Get the error state of a channel."""
@@ -601,14 +580,26 @@ class ReceiveThread(Thread):
             error = self.__bus_status[channel]['error_state']
         return error
 
+    def wait_for_error_state(self, channel, error_state, timeout=None):
+        """Block until the error state of a channel equals error_state.
+
+        Args:
+            timeout in seconds or None to wait indefinitely
+        Returns:
+            True if the error state matched before the timeout.
+        """
+        with self.__lock:
+            return self.__error_state_changed.wait_for(
+                lambda: self.get_error_state(channel) == error_state, timeout)
+
     def __start_logging(self):
         """Start logging all traffic."""
-        self.__log_request = None
+        self.__clear_log_request()
         file_opts = 'w+'
         # Append to the file if it already exists
         if path.isfile(self.__log_path):
             file_opts = 'a'
-        self.__log_file = open(self.__log_path, file_opts)
+        self.__log_file = open(self.__log_path, file_opts, buffering=1 << 16)
         logger.debug('Logging to: {}'.format(self.__log_path))
         data_str = 'date {} {} {} {}:{}:{} {}\n'
         days = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
@@ -638,9 +629,10 @@ class ReceiveThread(Thread):
         if self.__log_request == 'start':
             raise AssertionError('start_logging called twice.')
         elif self.__log_request == 'stop':
-            while self.__log_request == 'stop':
-                # Wait for the thread to stop the previous log
-                sleep(0.1)
+            # Wait for the thread to stop the previous log
+            with self.__lock:
+                self.__log_request_done.wait_for(
+                    lambda: self.__log_request != 'stop')
         directory, _ = path.split(log_path)
         if directory and not path.isdir(directory):
             raise ValueError('{} is not a valid directory!'.format(directory))
@@ -675,15 +667,22 @@ class ReceiveThread(Thread):
                 self.__sleep_time = 0.1
                 self.__logging = False
         self.__log_path = ''
-        self.__log_request = None
+        self.__clear_log_request()
         return old_path
 
+    def __clear_log_request(self):
+        """Mark the pending log request as handled and wake any waiters."""
+        with self.__lock:
+            self.__log_request = None
+            self.__log_request_done.notify_all()
+
     def stop_logging(self, delete_log):
         """Request the thread stop logging."""
         if self.__log_request == 'start':
-            while self.__log_request == 'start':
-                # Wait for the thread to start the previous log
-                sleep(0.1)
+            # Wait for the thread to start the previous log
+            with self.__lock:
+                self.__log_request_done.wait_for(
+                    lambda: self.__log_request != 'start')
         if self.__log_request != 'stop' and self.__log_path:
             old_path = self.__log_path
             logger.debug('Stop logging requested.')
@@ -700,7 +699,9 @@ class ReceiveThread(Thread):
             if channel in self.__msg_queues:
                 if msg_id in self.__msg_queues[channel]:
                     self.__msg_queues[channel].pop(msg_id)
-                self.__msg_queues[channel][msg_id] = Queue(queue_size)
+                # Like queue.Queue, a size of 0 or less means no limit
+                maxlen = queue_size if queue_size > 0 else None
+                self.__msg_queues[channel][msg_id] = deque(maxlen=maxlen)
                 self.__sleep_time = 0.01
             else:
                 logger.error(f'Channel {channel} not found in the rx thread.')
@@ -745,12 +746,11 @@ class ReceiveThread(Thread):
                 msg_queues = []
             if msg_id in msg_queues:
                 # logger.debug('RX: {: >8X} {: <64}'.format(msg_id, data))
-                if not msg_queues[msg_id].full():
-                    # logger.debug('queue.put()')
-                    msg_queues[msg_id].put((rx_time, data.replace(' ', '')))
-                    # logger.debug('queue.put() - returned')
+                queue = msg_queues[msg_id]
+                if queue.maxlen is None or len(queue) < queue.maxlen:
+                    queue.append((rx_time, data))
                 else:
-                    max_size = msg_queues[msg_id].maxsize
+                    max_size = queue.maxlen
                     logger.error(f'Queue for 0x{msg_id:X} is full. {data} '
                                   'wasn\'t added. The size is set to '
                                   f'{max_size}. Increase the size with the '
@@ -779,18 +779,21 @@ class ReceiveThread(Thread):
         else:
             msg_queues = []
         if msg_id in msg_queues:
-            if timeout is not None:
-                while self.__time is None:
-                    sleep(0.01)
-                end_time = self.__time + (timeout / 1000)
+            queue = msg_queues[msg_id]
+            if not queue:
+                if timeout is None:
+                    # Block until the receive thread queues a message
+                    end_time = float('inf')
+                else:
+                    while self.__time is None:
+                        sleep(0.01)
+                    end_time = self.__time + (timeout / 1000)
                 # logger.debug('wait_sem.acquire()')
                 self.__wait_args = (channel, msg_id, end_time)
                 self.__wait_sem.acquire()
                 # logger.debug('wait_sem.acquire() - returned')
-            if timeout is None or msg_queues[msg_id].qsize():
-                # logger.debug('queue.get()')
-                rx_time, msg_data = msg_queues[msg_id].get()
-                # logger.debug('queue.get() - returned')
+            if queue:
+                rx_time, msg_data = queue.popleft()
         else:
             logger.error('Queue for 0x{:X} hasn\'t been started! Call '
                           'start_queuing first.'.format(msg_id))
@@ -806,6 +809,10 @@ class TransmitThread(Thread):
         self.__lock = lock
         self.__messages = {}
         self.__num_msgs = 0
+        # Flat, parallel views of __messages rebuilt whenever it changes so
+        # the transmit loop only scans periods instead of nested dicts.
+        self.__periods = ()
+        self.__targets = ()
         self.__set_defaults()
         self.__updated = Condition(self.__lock)
 
@@ -826,13 +833,22 @@ class TransmitThread(Thread):
                         time_wasted += perf_counter() - start
                 else:
                     time_wasted = 0
-                    for channel, msgs in self.__messages.items():
-                        for msg in msgs.values():
-                            if self.__elapsed % msg.period == 0:
-                                if msg.update_func is not None:
-                                    msg.data = msg.update_func(msg)
-                                self.__vxl.send(channel, msg.id, msg.data,
-                                                msg.brs)
+                    # Collect the messages due this tick by channel
+                    elapsed = self.__elapsed
+                    due = {}
+                    for period, (channel, msg) in zip(self.__periods,
+                                                      self.__targets):
+                        if elapsed % period == 0:
+                            if msg.update_func is not None:
+                                msg.data = msg.update_func(msg)
+                            if channel not in due:
+                                due[channel] = []
+                            due[channel].append((msg.id, msg.raw_data,
+                                                 msg.brs))
+                    # Everything due this tick goes out in one driver call
+                    # per channel.
+                    for channel, frames in due.items():
+                        self.__vxl.send_many(channel, frames)
                     if self.__elapsed >= self.__max_increment:
                         self.__elapsed = self.__sleep_time_ms
                     else:
@@ -848,40 +864,22 @@ class TransmitThread(Thread):
     def __update_times(self):
         """Update times for the transmit loop."""
         old_sleep_time = self.__sleep_time_s
+        self.__targets = tuple((channel, msg)
+                               for channel, msgs in self.__messages.items()
+                               for msg in msgs.values())
+        self.__periods = tuple(msg.period for _, msg in self.__targets)
         if self.__num_msgs == 0:
             self.__set_defaults()
         else:
-            # Grab any message to use as starting values
-            for msgs in self.__messages.values():
-                if msgs:
-                    msg = list(msgs.values())[0]
-                    break
-            else:
+            if not self.__periods:
                 raise AssertionError('__num_msgs is out of sync')
-            self.__sleep_time_ms = msg.period
-            self.__sleep_time_s = msg.period / 1000.0
-            self.__max_increment = msg.period
-            if self.__num_msgs > 1:
-                msg_start = msg
-                curr_gcd = self.__sleep_time_ms
-                curr_lcm = self.__max_increment
-                prev = msg.period
-                for msgs in self.__messages.values():
-                    for msg in msgs.values():
-                        if msg is msg_start:
-                            continue
-                        curr = msg.period
-                        tmp_gcd = gcd(curr_gcd, curr)
-                        tmp_lcm = int(prev * curr / gcd(prev, curr))
-                        if tmp_gcd < curr_gcd:
-                            curr_gcd = tmp_gcd
-                        if tmp_lcm > curr_lcm:
-                            curr_lcm = tmp_lcm
-                        prev = curr
-                self.__sleep_time_ms = curr_gcd
-                self.__sleep_time_s = curr_gcd / 1000.0
-                self.__max_increment = curr_lcm
-            else:
+            # The loop ticks at the gcd of all periods and wraps at their lcm
+            curr_gcd = reduce(gcd, self.__periods)
+            curr_lcm = reduce(lambda a, b: a * b // gcd(a, b), self.__periods)
+            self.__sleep_time_ms = curr_gcd
+            self.__sleep_time_s = curr_gcd / 1000.0
+            self.__max_increment = curr_lcm
+            if self.__num_msgs == 1:
                 # First message added. Reset elapsed so the first transmit is
                 # sent at the correct time.
                 self.__elapsed = self.__sleep_time_ms
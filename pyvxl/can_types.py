@@ -3,17 +3,32 @@
 """CAN types used by pyvxl.CAN."""
 
 import logging
-from math import ceil
-from os import path
+from os import path, stat
+from threading import Lock
 from sys import exit, argv
 from pyvxl.pydbc import DBCParser
 from colorama import Fore, Back, Style
 from colorama import init as colorama_init
 from colorama import deinit as colorama_deinit
 from decimal import Decimal
+from copy import deepcopy
 
 logger = logging.getLogger(__name__)
 
+# (modification time, parsed objects) by absolute path. Parsing is much
+# slower than copying so each Database gets a deepcopy of the cached objects.
+# Editing a file replaces its entry instead of adding another one.
+_db_cache = {}
+_db_cache_lock = Lock()
+
+# Color prefixes used by pprint
+_MSG_COLOR = Style.BRIGHT + Fore.GREEN
+_NODE_COLOR = Back.RESET + Fore.MAGENTA
+_SIG_COLOR = Fore.CYAN + Style.BRIGHT
+_SENDING_COLOR = Fore.WHITE + Back.GREEN
+_NOT_SENDING_COLOR = Fore.WHITE + Back.RED
+_RESET_COLOR = Fore.RESET + Style.RESET_ALL
+
 
 class Database:
     """A CAN database."""
@@ -22,15 +37,23 @@ class Database:
         self.__nodes = {}
         self.__messages = {}
         self.__signals = {}
+        # Lowercase name indexes rebuilt on import
+        self.__msg_names = {}
+        self.__sig_long_names = {}
+        self.__msg_search = []
+        self.__sig_search = ()
         self.__protocol = 'CAN'
         self.path = db_path
 
     def __str__(self):
         """Return a string representation of this database."""
-        string = 'Database(None)'
-        if self.path is not None:
-            string = f'Database({path.basename(self.path)})'
-        return string
+        return self.__str
+
+    @classmethod
+    def clear_dbc_cache(cls):
+        """Forget all parsed dbc files so the next import parses again."""
+        with _db_cache_lock:
+            _db_cache.clear()
 
     @property
     def path(self):
@@ -51,31 +74,62 @@ class Database:
             if ext not in supported:
                 raise TypeError(f'{db_path} is not supported. Supported file '
                                 f'types: {supported}')
+            self.__str = f'Database({path.basename(db_path)})'
             if ext == '.dbc':
                 self.__import_dbc(db_path)
         else:
             self.__path = None
+            self.__str = 'Database(None)'
 
     def __import_dbc(self, db):
         """Import a dbc."""
         self.__path = db
-        p = DBCParser(db, Node, Message, Signal, write_tables=0, debug=False)
-        if not p.messages:
-            raise ValueError(f'{db} contains no messages.')
-
-        self.__nodes = p.nodes
-        self.__messages = p.messages
-        self.__signals = p.signals
-
-        can_fd = False
-        if p.can_fd_support:
+        abs_path = path.abspath(db)
+        mtime = stat(db).st_mtime_ns
+        # Held while parsing so databases imported from multiple threads only
+        # parse the file once
+        with _db_cache_lock:
+            cached_mtime, parsed = _db_cache.get(abs_path, (None, None))
+            if cached_mtime != mtime:
+                p = DBCParser(db, Node, Message, Signal, write_tables=0,
+                              debug=False)
+                if not p.messages:
+                    raise ValueError(f'{db} contains no messages.')
+                parsed = (p.nodes, p.messages, p.signals, p.can_fd_support)
+                _db_cache[abs_path] = (mtime, parsed)
+        # Copy so databases imported from the same file don't share state
+        nodes, messages, signals, can_fd = deepcopy(parsed)
+
+        self.__nodes = nodes
+        self.__messages = messages
+        self.__signals = signals
+        # Index names once so lookups by name don't scan the database. The
+        # first message or signal with a duplicate name wins.
+        self.__msg_names = {}
+        # (name, message) for substring searches
+        self.__msg_search = []
+        for msg in messages.values():
+            name = msg.name.lower()
+            self.__msg_names.setdefault(name, msg)
+            self.__msg_search.append((name, msg))
+        self.__sig_long_names = {}
+        for sigs in signals.values():
+            for sig in sigs:
+                if sig.long_name:
+                    self.__sig_long_names.setdefault(sig.long_name.lower(),
+                                                     sig)
+        # (short name, long name, signal) for substring searches
+        self.__sig_search = tuple((sig.name.lower(), sig.long_name.lower(), sig)
+                                  for msg in messages.values()
+                                  for sig in msg.signals)
+
+        if can_fd:
             self.__protocol = 'CAN FD'
-            can_fd = True
 
         # Set the id_type on each message in case the dbc did not specify it
         # for all messages. DBCs that are only standard CAN won't include the
         # id_type.
-        for msg in p.messages.values():
+        for msg in messages.values():
             if msg.id_type is None:
                 if not can_fd and msg.id <= 0x7FF:
                     msg.id_type = 'CAN Standard'
@@ -100,9 +154,10 @@ class Database:
         """Get a node by name."""
         if not isinstance(name, str):
             raise TypeError('Expected str but got {}'.format(type(name)))
-        if name.lower() not in self.nodes:
+        node = self.__nodes.get(name.lower())
+        if node is None:
             raise ValueError(f'Node {name} not found in database {self.path}')
-        return self.__nodes[name.lower()]
+        return node
 
     @property
     def messages(self):
@@ -121,11 +176,14 @@ class Database:
         if not isinstance(data, str):
             raise TypeError(f'Expected str but got {type(data)}')
         data = data.replace(' ', '')
-        dlc = ceil(len(data) / 2)
+        dlc = (len(data) + 1) // 2
         msg = Message(msg_id, name, dlc)
         msg.period = period
         msg.data = data
         self.messages[msg.id] = msg
+        name = msg.name.lower()
+        self.__msg_names.setdefault(name, msg)
+        self.__msg_search.append((name, msg))
         return msg
 
     def get_message(self, name_or_id):
@@ -136,59 +194,47 @@ class Database:
         to be unique whereas message IDs are.
         """
         message = None
-        if isinstance(name_or_id, str):
-            for msg in self.messages.values():
-                if name_or_id.lower() == msg.name.lower():
-                    message = msg
-                    break
-            else:
-                raise ValueError(f'{name_or_id} does not match a message name '
-                                 f'in {self}')
-        elif isinstance(name_or_id, int) and not isinstance(name_or_id, bool):
+        # IDs are the common case, so check for them first
+        if isinstance(name_or_id, int) and not isinstance(name_or_id, bool):
             # Strip the extended ID bit if it exists
             name_or_id &= 0x1fffffff
-            if name_or_id not in self.messages:
+            message = self.__messages.get(name_or_id)
+            if message is None:
                 raise ValueError(f'0x{name_or_id:X} does not match a message '
                                  f'id in {self}')
-            message = self.messages[name_or_id]
+        elif isinstance(name_or_id, str):
+            message = self.__msg_names.get(name_or_id.lower())
+            if message is None:
+                raise ValueError(f'{name_or_id} does not match a message name '
+                                 f'in {self}')
         else:
             raise TypeError(f'Expected str or int but got {type(name_or_id)}')
         return message
 
-    def find_messages(self, name, print_result=False):
-        """Find messages by name.
+    def find_messages(self, name_or_id, print_result=False):
+        """Find messages by name or id.
 
-        Returns a list of message objects.
+        Returns a list of messages whose names contain name_or_id or a list
+        with the single message matching an id.
         """
-        raise NotImplementedError
-        num_found = 0
-        msg_id = self._check_message(name)
-        if isinstance(msg_id, int) and not isinstance(msg_id, bool):
-            name &= 0x1fffffff
-            try:
-                msg = self.imported.messages[msg_id]
-                num_found += 1
-                if print_result:
-                    self._print_msg(msg)
-                    for sig in msg.signals:
-                        self._print_sig(sig)
-            except KeyError:
-                logger.error('Message ID 0x{:X} not found!'.format(msg_id))
-                return False
+        if isinstance(name_or_id, int) and not isinstance(name_or_id, bool):
+            # IDs are unique so there's no need to scan
+            msg = self.messages.get(name_or_id & 0x1fffffff)
+            messages = [msg] if msg is not None else []
+        elif isinstance(name_or_id, str):
+            name = name_or_id.lower()
+            messages = [msg for msg_name, msg in self.__msg_search
+                        if name in msg_name]
         else:
-            for msg in self.messages.values():
-                if msg_id.lower() in msg.name.lower():
-                    num_found += 1
-                    if print_result:
-                        self._print_msg(msg)
-                        for sig in msg.signals:
-                            self._print_sig(sig)
-        if num_found == 0:
-            if print_result:
+            raise TypeError(f'Expected str or int but got {type(name_or_id)}')
+        if print_result:
+            if not messages:
                 logger.info('No messages found for that input')
-        elif num_found > 1:
-            pass
-        return True
+            for msg in messages:
+                msg.pprint()
+                for sig in msg.signals:
+                    sig.pprint()
+        return messages
 
     @property
     def signals(self):
@@ -201,21 +247,16 @@ class Database:
         if not isinstance(name, str):
             raise TypeError(f'Expected str but got {type(name)}')
 
-        if name.lower() in self.signals:
-            signals = self.signals[name.lower()]
+        key = name.lower()
+        signals = self.signals.get(key)
+        if signals is not None:
             if len(signals) == 1:
                 signal = signals[0]
             else:
                 signal = signals
         else:
-            for signals in self.signals.values():
-                for sig in signals:
-                    if name.lower() == sig.long_name:
-                        signal = sig
-                        break
-                if signal is not None:
-                    break
-            else:
+            signal = self.__sig_long_names.get(key)
+            if signal is None:
                 raise ValueError(f'{name} does not match a short or long '
                                  f'signal name in {self}')
 
@@ -224,29 +265,22 @@ class Database:
     def find_signals(self, name, print_result=False):
         """Find signals by name.
 
-        Returns a list of signals whose names contain the input name.
+        Returns a list of signals whose short or long names contain name.
         """
-        raise NotImplementedError
-        signals = []
         if not isinstance(name, str):
-            raise TypeError(f'Expected str, but got {type(name)}')
-        num_found = 0
-        for msg in self.messages.values():
-            msgPrinted = False
-            for sig in msg.signals:
-                short_name = (search_str.lower() in sig.name.lower())
-                full_name = (search_str.lower() in sig.long_name.lower())
-                if full_name or short_name:
-                    num_found += 1
-                    if display:
-                        if not msgPrinted:
-                            self._print_msg(msg)
-                            msgPrinted = True
-                        self._print_sig(sig)
-        if num_found == 0:
-            logger.info('No signals found for that input')
-        elif num_found > 1:
-            pass
+            raise TypeError(f'Expected str but got {type(name)}')
+        name = name.lower()
+        signals = [sig for short_name, long_name, sig in self.__sig_search
+                   if name in short_name or name in long_name]
+        if print_result:
+            if not signals:
+                logger.info('No signals found for that input')
+            msg = None
+            for sig in signals:
+                if sig.msg is not msg:
+                    msg = sig.msg
+                    msg.pprint()
+                sig.pprint()
         return signals
 
 
@@ -390,7 +424,18 @@ class Message:
             raise ValueError(f'Msg: {self.name}, DLC: {self.dlc}\n CAN FD '
                              f'dlc must be {self.__valid_fd_dlcs}')
         self.__dlc = dlc
-        self.__max_val = int('FF' * dlc, 16)
+        self.__hex_len = dlc * 2
+        self.__max_val = (1 << 8 * dlc) - 1
+        try:
+            data = self.__data
+        except AttributeError:
+            # Signals haven't been added yet; they set the data
+            pass
+        else:
+            # Drop bytes past the new length so data and raw_data agree
+            data &= self.__max_val
+            self.__data = data
+            self.__raw_data = data.to_bytes(dlc, 'big')
 
     @property
     def signals(self):
@@ -426,8 +471,16 @@ class Message:
                         raise AssertionError(f'{added_sig} and {sig} overlap')
 
         self.__signals = signals
-        if not self.__signals:
-            self.data = 0
+        # (signal, mask) pairs so setting data doesn't recheck each signal
+        self.__sig_layout = tuple((sig, sig.mask) for sig in signals)
+        self.__sig_mask = mask_check
+        # Signals keep this up to date through _set_sig_val so reading data
+        # doesn't need to combine every signal.
+        data = 0
+        for sig in signals:
+            data |= sig.msg_val
+        self.__data = data
+        self.__raw_data = data.to_bytes(self.__dlc, 'big')
 
     @property
     def data(self):
@@ -436,14 +489,7 @@ class Message:
         This value is always returned in big endian format since that's how
         it will be transmitted on the bus.
         """
-        data = 0
-        if self.signals:
-            for sig in self.signals:
-                # Set the value
-                data |= sig.msg_val
-        else:
-            data = self.__data
-        return f'{data:0{self.dlc*2}X}'
+        return f'{self.__data:0{self.__hex_len}X}'
 
     @data.setter
     def data(self, data):
@@ -464,10 +510,21 @@ class Message:
             raise ValueError(f'{data:X} must be positive and less than the '
                              f'maximum value of {self.__max_val:X}!')
         if self.signals:
-            for sig in self.signals:
-                sig.msg_val = data
-        else:
-            self.__data = data
+            for sig, mask in self.__sig_layout:
+                sig._set_msg_val(data & mask)
+            # Bits outside of all signals aren't stored
+            data &= self.__sig_mask
+        self.__data = data
+        self.__raw_data = data.to_bytes(self.__dlc, 'big')
+
+    @property
+    def raw_data(self):
+        """The message data as bytes, ready to be transmitted.
+
+        The bytes are rebuilt whenever the data changes, never when read, so
+        the tx thread can't cache bytes from data that was just replaced.
+        """
+        return self.__raw_data
 
     @property
     def period(self):
@@ -516,24 +573,30 @@ class Message:
             raise TypeError(f'Expected bool but got {type(value)}')
         self.__sending = value
 
+    def _set_sig_val(self, mask, msg_val):
+        """Update the message data after one of its signals changes.
+
+        This is meant to be an internal function for pyvxl only.
+        """
+        data = self.__data & ~mask | msg_val
+        self.__data = data
+        self.__raw_data = data.to_bytes(self.__dlc, 'big')
+
     def pprint(self):
         """Print colored info about the message to stdout."""
         colorama_init()
         print('')
-        color = Style.BRIGHT + Fore.GREEN
         data = self.data
-        print(f'{color}Message: {self.name} - ID: 0x{self.id:X} - Data: '
+        print(f'{_MSG_COLOR}Message: {self.name} - ID: 0x{self.id:X} - Data: '
               f'0x{data}')
-        reset_color = Fore.RESET + Style.RESET_ALL
-        node_color = Back.RESET + Fore.MAGENTA
         cycle_status = ' - Non-periodic'
-        node = f'{node_color} - TX Node: {self.sender}{reset_color}'
+        node = f'{_NODE_COLOR} - TX Node: {self.sender}{_RESET_COLOR}'
         if self.period != 0:
             sending = 'Not Sending'
-            send_color = Fore.WHITE + Back.RED
+            send_color = _NOT_SENDING_COLOR
             if self.sending:
                 sending = 'Sending'
-                send_color = Fore.WHITE + Back.GREEN
+                send_color = _SENDING_COLOR
             cycle_status = (f' - Cycle time(ms): {self.period}'
                             f' - Status: {send_color}{sending}')
         print(cycle_status + node)
@@ -652,7 +715,7 @@ class Signal:
         if msg.dlc in msb_map and self.__bit_msb in msb_map[msg.dlc]:
             self.__bit_start = Signal.__msb_map[msg.dlc][self.__bit_msb]
         self.__bit_start -= self.bit_len - 1
-        self.__mask = 2 ** self.bit_len - 1 << self.__bit_start
+        self.__mask = (1 << self.bit_len) - 1 << self.__bit_start
         self.__msg = msg
 
     @property
@@ -701,6 +764,9 @@ class Signal:
             raise TypeError(error)
         self.__values_by_name = val_dict
         self.__values_by_num = dict((v, k) for k, v in val_dict.items())
+        # Lowercase names so val can be set case insensitively
+        self.__values_by_lname = dict((k.lower(), v)
+                                      for k, v in val_dict.items())
 
     @property
     def min_val(self):
@@ -715,11 +781,11 @@ class Signal:
 
         if self.signed:
             bit_len = self.bit_len - 1
-            max_positive = self._scale(int('0' + ('1' * bit_len), 2))
-            max_negative = self._scale(int('1' + ('0' * bit_len), 2))
+            max_positive = self._scale((1 << bit_len) - 1)
+            max_negative = self._scale(1 << bit_len)
             all_bits = min(max_positive, max_negative)
         else:
-            all_bits = self._scale(int('1' * self.bit_len, 2))
+            all_bits = self._scale((1 << self.bit_len) - 1)
 
         no_bits = self._scale(0)
         min_possible = min(all_bits, no_bits)
@@ -743,11 +809,11 @@ class Signal:
 
         if self.signed:
             bit_len = self.bit_len - 1
-            max_positive = self._scale(int('0' + ('1' * bit_len), 2))
-            max_negative = self._scale(int('1' + ('0' * bit_len), 2))
+            max_positive = self._scale((1 << bit_len) - 1)
+            max_negative = self._scale(1 << bit_len)
             all_bits = max(max_positive, max_negative)
         else:
-            all_bits = self._scale(int('1' * self.bit_len, 2))
+            all_bits = self._scale((1 << self.bit_len) - 1)
 
         no_bits = self._scale(0)
         max_possible = max(all_bits, no_bits)
@@ -768,7 +834,18 @@ class Signal:
         """Set the value based on the full message data."""
         if not isinstance(msg_data, int) or isinstance(msg_data, bool):
             raise TypeError(f'Expected int but got {type(msg_data)}')
-        self.__val = msg_data & self.mask
+        mask = self.mask
+        self.__val = msg_data & mask
+        self.__msg._set_sig_val(mask, self.__val)
+
+    def _set_msg_val(self, msg_val):
+        """Set msg_val from data that's already been masked and validated.
+
+        This is meant to be an internal function for pyvxl only. If you
+        call this function externally, make sure you are aware of the problems
+        you can create.
+        """
+        self.__val = msg_val
 
     @property
     def raw_val(self):
@@ -797,40 +874,43 @@ class Signal:
     @val.setter
     def val(self, val):
         """Set the signal value based on the offset and scale."""
-        value_error = (f'{val} is invalid for {self.name}; valid values = '
-                       f'{self.values}.')
-        range_error = (f'Value {val} out of range! Valid range is '
-                       f'{self.min_val} to {self.max_val} for signal '
-                       f'{self.name}.')
-
         if isinstance(val, (float, int)):
             if val in self.__values_by_num:
                 pass
             elif self.min_val <= val <= self.max_val:
                 val = Decimal(str(val))
             elif self.values:
-                raise ValueError(f'{value_error}\nAND\n{range_error}')
+                raise ValueError(f'{self.__value_error(val)}\nAND\n'
+                                 f'{self.__range_error(val)}')
             else:
-                raise ValueError(range_error)
+                raise ValueError(self.__range_error(val))
         elif isinstance(val, str):
             if not self.values:
-                raise ValueError(value_error)
-            # val.lower() to make this case insensitive
-            lower_vals = dict((val.lower(), val) for val in self.values)
-            if val.lower() in lower_vals:
-                val = self.values[lower_vals[val.lower()]]
-            else:
-                raise ValueError(value_error)
+                raise ValueError(self.__value_error(val))
+            num = self.__values_by_lname.get(val.lower())
+            if num is None:
+                raise ValueError(self.__value_error(val))
+            val = num
 
         else:
             raise TypeError(f'Expected str, int or float but got {type(val)}')
 
         self.raw_val = self._unscale(val)
 
+    def __value_error(self, val):
+        """Return the error message for a value not in self.values."""
+        return (f'{val} is invalid for {self.name}; valid values = '
+                f'{self.values}.')
+
+    def __range_error(self, val):
+        """Return the error message for a value outside min and max."""
+        return (f'Value {val} out of range! Valid range is '
+                f'{self.min_val} to {self.max_val} for signal {self.name}.')
+
     def _scale(self, val):
         """Scale a number based on the other attributes in this signal."""
         if self.endianness == 'little':
-            num_bytes = ceil(self.bit_len / 8)
+            num_bytes = (self.bit_len + 7) // 8
             tmp = val.to_bytes(num_bytes, 'little', signed=self.signed)
             val = int.from_bytes(tmp, 'big', signed=self.signed)
 
@@ -862,7 +942,7 @@ class Signal:
         else:
             negative = False
 
-        if len(f'{val:b}') > self.bit_len:
+        if val.bit_length() > self.bit_len:
             raise ValueError(f'Unable to set {self.name} to {val}; value too '
                              'large!')
         if negative:
@@ -870,55 +950,38 @@ class Signal:
 
         # Swap the byte order if necessary
         if self.endianness == 'little':
-            num_bytes = ceil(self.bit_len / 8)
+            num_bytes = (self.bit_len + 7) // 8
             tmp = val.to_bytes(num_bytes, 'little', signed=self.signed)
             val = int.from_bytes(tmp, 'big', signed=self.signed)
         return val
 
     def _twos_complement(self, num):
         """Return the twos complement value of a number."""
-        # TODO: Switch to something like the line below
-        # pv_val = int('{:b}'.format(abs(int(pv_val) - (1 << pv_len)))[-pv_len:], 2)
-        tmp = '{:b}'.format(num)
-        tmp = tmp.replace('0', '2')
-        tmp = tmp.replace('1', '0')
-        tmp = tmp.replace('2', '1')
-
-        while len(tmp) < self.bit_len:
-            tmp = '1' + tmp
-        return int(tmp, 2) + 1
+        return (1 << self.bit_len) - num
 
     def pprint(self, short_name=False, value=False):
         """Print colored info abnout the signal to stdout."""
         colorama_init()
-        color = Fore.CYAN + Style.BRIGHT
-        rst = Fore.RESET + Style.RESET_ALL
         if not short_name and not self.long_name:
             short_name = True
         if short_name:
             name = self.name
         else:
             name = self.long_name
-        print('{} - Signal: {}'.format(color, name))
-        if self.values.keys():
+        print(f'{_SIG_COLOR} - Signal: {name}')
+        if self.values:
             if value:
-                print('            ^- {}{}'.format(self.value, rst))
+                print(f'            ^- {self.val}{_RESET_COLOR}')
             else:
-                print('            ^- [')
-                multiple = False
-                for key, val in self.values.items():
-                    if multiple:
-                        print(', ')
-                    print('{}({})'.format(key, hex(val)))
-                    multiple = True
-                print(']{}\n'.format(rst))
+                values = '\n, \n'.join(f'{key}({val:#x})'
+                                        for key, val in self.values.items())
+                print(f'            ^- [\n{values}\n]{_RESET_COLOR}\n')
         else:
             if value:
-                print('            ^- {}{}{}'.format(self.value, self.units,
-                                                     rst))
+                print(f'            ^- {self.val}{self.units}{_RESET_COLOR}')
             else:
-                print('            ^- [{} : {}]{}'.format(self.min_val,
-                                                          self.max_val, rst))
+                print(f'            ^- [{self.min_val} : {self.max_val}]'
+                      f'{_RESET_COLOR}')
         colorama_deinit()
 
 
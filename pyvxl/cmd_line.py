@@ -6,7 +6,7 @@ import sys
 import logging
 import traceback
 import socket
-import select
+import struct
 import os
 import subprocess
 from argparse import ArgumentParser
@@ -15,94 +15,154 @@ from pyvxl import config
 from pyvxl import CAN
 
 __program__ = 'can'
+_VALID_COMMANDS = frozenset(['send', 'stop', 'stopall', 'find', 'stopnode',
+                             'log', 'periodics', 'config', 'h', 'waitfor',
+                             'help', 'exit', 'q', 'restart'])
+
+
+_HELP = '\n'.join([
+    'Valid commands:',
+    '',
+    ' - Bus Manipulation -----------------------------------------------------------',
+    '  restart',
+    '     - Reconnects to the CAN bus. Useful if the error light on the CAN case is',
+    '       red.',
+    '',
+    '  send signal <-f> <signal> <value> ',
+    '     - Send the msg containing <signal> with the signal value = <value>.',
+    '       <-f> can be specified to send a value not defined in the dbc file.',
+    '       e.g., send signal system power mode run',
+    '        or    ""    ""   syspwrmd          ""',
+    '',
+    '  send message <msgID> <data>',
+    '     - Send a complete message similar to the way it is displayed in CANoe.',
+    '       <msgID> can be the hexadecimal id or full name of the message. <data>',
+    '       is the message data to be sent. If the data given is shorter than',
+    '       specified by the dlc in the database, \'0\'s will be appended to the',
+    '       left of the entered message data to make it the correct length.',
+    '       e.g., send message 0x10242040 02',
+    '        or    ""    ""      10242040 02',
+    '',
+    '  send diag <txMsgID> <data> <rxMsgID>',
+    '     - Send a diagnostic message and wait for a response. <txMsgID> is the',
+    '       message id or name to transmit from. <data> is the data which will',
+    '       be sent with that message. <rxMsgId> is the id or name of the',
+    '       message to wait for a response from.',
+    '',
+    '  send lastfound <signal|message> <value> ',
+    '     - Sends the last found signal or message with <value>.',
+    '       e.g., send lastfound message 02',
+    '        or    ""     ""     signal run',
+    '',
+    '  wait <time> <msgId> [value]',
+    '     - Waits for <time>(ms) for msgId with value to be received. \'*\' can be',
+    '       used as a dont care. Returns 1 if found, else 0.',
+    '       e.g., wait 1000 0x10242040',
+    '              ""   ""      ""     02',
+    '              ""   ""      ""     *2',
+    '',
+    '  stop <signal|msgID>',
+    '     - Stops sending a periodic message',
+    '       e.g., stop system power mode',
+    '             stop syspwrmd',
+    '             stop 0x10242040',
+    '',
+    '  stopnode <node>',
+    '     - Stops all periodic messages sent from <node>',
+    '',
+    '  stopall',
+    '     - Stops all periodic messages',
+    '',
+    ' - Database & Bus Information -------------------------------------------------',
+    '',
+    '  config',
+    '     - Print the current vector hardware configuration',
+    '',
+    '  find node <string>',
+    '     - Prints all nodes found with <string> in their name',
+    '',
+    '  find message <string>',
+    '     - Prints all messages found with <string> in their name',
+    '',
+    '  find signal <string>',
+    '     - Prints all signals found with <string> in their name',
+    '',
+    '  periodics [info]',
+    '     - Prints all periodic messages being sent. If \'info\' is present, signals',
+    '       of each periodic and their values are also printed.',
+    '',
+    '  periodics info <val>',
+    '     - Prints current periodics including signal values. <val> can be either a',
+    '       message id, part of a message name, or part of a signal name.',
+    '',
+    '  log <command> [file]',
+    '     - Controls logging to [file]. <command> can be either \'start\' or \'stop\'.',
+    '       If [filename] is not specified, a default name will be chosen.',
+    '',
+    ' - Other ----------------------------------------------------------------------',
+    '  exit | ctrl+c | q     - Exit the app',
+    '  h | help              - Display this message',
+])
 
 
 def print_help():
     """Called by the command h or help."""
-    helpcolor = Fore.RED + Style.BRIGHT
-    helprst = Fore.RESET + Style.RESET_ALL
-    # TODO: Convert this to a list and print(like it's being piped to less)
-    print(helpcolor + 'Valid commands:')
-    print('')
-    print(' - Bus Manipulation -----------------------------------------------------------')
-    print('  restart')
-    print('     - Reconnects to the CAN bus. Useful if the error light on the CAN case is')
-    print('       red.')
-    print('')
-    print('  send signal <-f> <signal> <value> ')
-    print('     - Send the msg containing <signal> with the signal value = <value>.')
-    print('       <-f> can be specified to send a value not defined in the dbc file.')
-    print('       e.g., send signal system power mode run')
-    print('        or    ""    ""   syspwrmd          ""')
-    print('')
-    print('  send message <msgID> <data>')
-    print('     - Send a complete message similar to the way it is displayed in CANoe.')
-    print('       <msgID> can be the hexadecimal id or full name of the message. <data>')
-    print('       is the message data to be sent. If the data given is shorter than')
-    print('       specified by the dlc in the database, \'0\'s will be appended to the')
-    print('       left of the entered message data to make it the correct length.')
-    print('       e.g., send message 0x10242040 02')
-    print('        or    ""    ""      10242040 02')
-    print('')
-    print('  send diag <txMsgID> <data> <rxMsgID>')
-    print('     - Send a diagnostic message and wait for a response. <txMsgID> is the')
-    print('       message id or name to transmit from. <data> is the data which will')
-    print('       be sent with that message. <rxMsgId> is the id or name of the')
-    print('       message to wait for a response from.')
-    print('')
-    print('  send lastfound <signal|message> <value> ')
-    print('     - Sends the last found signal or message with <value>.')
-    print('       e.g., send lastfound message 02')
-    print('        or    ""     ""     signal run')
-    print('')
-    print('  wait <time> <msgId> [value]')
-    print('     - Waits for <time>(ms) for msgId with value to be received. \'*\' can be')
-    print('       used as a dont care. Returns 1 if found, else 0.')
-    print('       e.g., wait 1000 0x10242040')
-    print('              ""   ""      ""     02')
-    print('              ""   ""      ""     *2')
-    print('')
-    print('  stop <signal|msgID>')
-    print('     - Stops sending a periodic message')
-    print('       e.g., stop system power mode')
-    print('             stop syspwrmd')
-    print('             stop 0x10242040')
-    print('')
-    print('  stopnode <node>')
-    print('     - Stops all periodic messages sent from <node>')
-    print('')
-    print('  stopall')
-    print('     - Stops all periodic messages')
-    print('')
-    print(' - Database & Bus Information -------------------------------------------------')
-    print('')
-    print('  config')
-    print('     - Print the current vector hardware configuration')
-    print('')
-    print('  find node <string>')
-    print('     - Prints all nodes found with <string> in their name')
-    print('')
-    print('  find message <string>')
-    print('     - Prints all messages found with <string> in their name')
-    print('')
-    print('  find signal <string>')
-    print('     - Prints all signals found with <string> in their name')
-    print('')
-    print('  periodics [info]')
-    print('     - Prints all periodic messages being sent. If \'info\' is present, signals')
-    print('       of each periodic and their values are also printed.')
-    print('')
-    print('  periodics info <val>')
-    print('     - Prints current periodics including signal values. <val> can be either a')
-    print('       message id, part of a message name, or part of a signal name.')
-    print('')
-    print('  log <command> [file]')
-    print('     - Controls logging to [file]. <command> can be either \'start\' or \'stop\'.')
-    print('       If [filename] is not specified, a default name will be chosen.')
-    print('')
-    print(' - Other ----------------------------------------------------------------------')
-    print('  exit | ctrl+c | q     - Exit the app')
-    print('  h | help              - Display this message'+helprst)
+    print(f'{Fore.RED}{Style.BRIGHT}{_HELP}{Fore.RESET}{Style.RESET_ALL}')
+
+
+# How long the listener waits for the rest of a line before treating what it
+# has as a single unframed command from an older client
+_LEGACY_WAIT_S = 0.2
+
+
+def _recv_commands(conn):
+    """Yield (command, framed) for each command received on conn.
+
+    Clients send one command per line. Older clients send a single command
+    without a newline and wait for the reply, so a partial line that stays
+    idle is returned as an unframed command and ends the connection.
+    """
+    buf = b''
+    while True:
+        while b'\n' not in buf:
+            conn.settimeout(_LEGACY_WAIT_S if buf else None)
+            try:
+                data = conn.recv(4096)
+            except socket.timeout:
+                data = b''
+            except OSError:
+                return
+            if not data:
+                if buf.strip():
+                    yield buf.decode().strip(), False
+                return
+            buf += data
+        line, buf = buf.split(b'\n', 1)
+        yield line.decode().strip(), True
+
+
+def _send_reply(conn, data, framed):
+    """Send the reply to one network command.
+
+    Framed connections get exactly one length-prefixed reply per command,
+    empty when the command returned nothing, so replies stay aligned with
+    commands.
+    """
+    if data is None or data is False:
+        data = b''
+    if isinstance(data, (bytes, bytearray)):
+        reply = bytes(data)
+    else:
+        reply = str(data).encode()
+    if framed:
+        # Header and payload go out in one write
+        reply = struct.pack('!I', len(reply)) + reply
+    elif not reply:
+        return
+    try:
+        conn.sendall(reply)
+    except OSError as e:
+        logging.error(f'Unable to send a reply: {e}')
 
 def main():
     """This script is intended to test and demonstrate the functionality
@@ -123,7 +183,8 @@ def main():
                         ' can channel')
     parser.add_argument('-ns', '--network-send', metavar='cmd', type=str,
                         nargs='+', help='commands to send to a separate '+
-                        'instance of the program running in network mode')
+                        'instance of the program running in network mode. '+
+                        'separate multiple commands with \';\'')
     args = parser.parse_args()
     if args.network_send:
         messages = args.network_send
@@ -141,6 +202,9 @@ def main():
         HOST = 'localhost'
         PORT = 50000+(2*channel)
         sendSock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        # Commands are small request/response pairs; don't let Nagle's
+        # algorithm hold them back waiting for an ACK.
+        sendSock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
         try:
             sendSock.connect((HOST, PORT))
         except socket.error:
@@ -148,10 +212,33 @@ def main():
                           ' is running in network mode and that the channel'+
                           ' specified\nis correct.')
             sys.exit(1)
-        sendSock.sendall(' '.join(messages))
-        if len(messages) > 2:
-            if messages[1] == 'diag':
-                print(sendSock.recv(128))
+        # Multiple commands separated by ';' share one connection. Each
+        # command is sent on its own line.
+        commands = [cmd.strip() for cmd in ' '.join(messages).split(';')]
+        commands = [cmd for cmd in commands if cmd]
+        sendSock.sendall(''.join(f'{cmd}\n' for cmd in commands).encode())
+        # Tell the listener there are no more commands, then read responses
+        # until it closes the connection.
+        sendSock.shutdown(socket.SHUT_WR)
+        resp = []
+        while True:
+            data = sendSock.recv(4096)
+            if not data:
+                break
+            resp.append(data)
+        # The listener sends one length-prefixed reply per command
+        resp = b''.join(resp)
+        replies = []
+        offset = 0
+        while offset + 4 <= len(resp):
+            size, = struct.unpack_from('!I', resp, offset)
+            offset += 4
+            replies.append(resp[offset:offset + size])
+            offset += size
+        for cmd, reply in zip(commands, replies):
+            if reply:
+                reply = reply.decode(errors='replace')
+                print(f'{cmd}: {reply}' if len(commands) > 1 else reply)
         sendSock.close()
         sys.exit(0)
     elif args.example_script:
@@ -159,7 +246,7 @@ def main():
         path = os.path.dirname(os.path.realpath(__file__))+'\\'+script
         print('Example script located at: \n'+path)
         try:
-            action = raw_input('\nRun example? (y/n): ')
+            action = input('\nRun example? (y/n): ')
         except KeyboardInterrupt:
             pass
         if action.lower() == 'y':
@@ -181,7 +268,7 @@ def main():
         channel = args.channel
     try:
         if not channel:
-            channel = raw_input('Enter the CAN channel you\'d like to open: ')
+            channel = input('Enter the CAN channel you\'d like to open: ')
         if channel:
             try:
                 channel = int(channel)
@@ -192,7 +279,7 @@ def main():
             logging.warning('Defaulting to channel 1')
             channel = 1
         if not baudRate:
-            baudRate = raw_input('Enter the baudrate for that channel: ')
+            baudRate = input('Enter the baudrate for that channel: ')
         if baudRate:
             try:
                 baudRate = int(baudRate)
@@ -209,7 +296,7 @@ def main():
             imported = can.import_dbc()
         while not imported:
             toprint = 'Enter the path to a dbc file (press enter to skip): '
-            dbcPath = raw_input(toprint)
+            dbcPath = input(toprint)
             if dbcPath:
                 can.dbc_path = dbcPath
                 imported = can.import_dbc()
@@ -229,35 +316,46 @@ def main():
         logging.info('Starting in database only mode')
     elif not can.imported:
         logging.info('Starting in CAN only mode')
-    validCommands = ['send', 'stop', 'stopall', 'find', 'stopnode', 'log',
-                     'periodics', 'config', 'h', 'waitfor', 'help', 'exit',
-                     'q', 'restart']
     HOST = ''
     PORT = 50000+(2*channel)
     sock = None
     conn = None
+    commands = None
+    framed = False
     if args.network_listen:
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        # Allow restarting right away while the last connection is in
+        # TIME_WAIT
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         sock.bind((HOST, PORT))
         sock.listen(1)
+        # accept wakes up every few seconds so ctrl+c is still handled
+        sock.settimeout(3)
     while 1:
         try:
+            reply = None
             if not args.network_listen:
-                o = raw_input('> ')
+                o = input('> ')
             else:
-                waiting = True
-                while waiting:
-                    inputr, [], [] = select.select([sock], [], [], 3)
-                    for s in inputr:
-                        if s == sock:
-                            waiting = False
-                conn, addr = sock.accept() # pylint: disable=W0612
-                o = conn.recv(128)
+                if conn is None:
+                    try:
+                        conn, addr = sock.accept() # pylint: disable=W0612
+                    except socket.timeout:
+                        continue
+                    conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                    commands = _recv_commands(conn)
+                # Keep reading commands until the client is done with the
+                # connection.
+                o, framed = next(commands, (None, False))
+                if o is None:
+                    conn.close()
+                    conn = None
+                    continue
             if o:
                 s = o.split()
                 command = s[0]
                 value = s[-1]
-                if command in validCommands:
+                if command in _VALID_COMMANDS:
                     if command == 'restart':
                         can.stop()
                         can.start()
@@ -289,22 +387,12 @@ def main():
                                 # pylint: disable=W0612,C0301
                                 for x in range(len(s[2:-1])):
                                     testSig = ' '.join(s[2:sigStop]).lower()
-                                    if can.parser.dbc.signals.has_key(testSig):
-                                        val = ' '.join(s[sigStop:]).lower()
-                                        if can.parser.dbc.signals[testSig].values.keys() and not force:
-                                            if can.parser.dbc.signals[testSig].values.has_key(val):
-                                                can.send_signal(testSig, val)
-                                                break
-                                        else:
-                                            try:
-                                                can.send_signal(testSig, val, force)
-                                                break
-                                            except ValueError:
-                                                pass
-                                    elif can.parser.dbc.signalsByName.has_key(testSig):
+                                    sig = (can.parser.dbc.signals.get(testSig) or
+                                           can.parser.dbc.signalsByName.get(testSig))
+                                    if sig is not None:
                                         val = ' '.join(s[sigStop:]).lower()
-                                        if can.parser.dbc.signalsByName[testSig].values.keys() and not force:
-                                            if can.parser.dbc.signalsByName[testSig].values.has_key(val):
+                                        if sig.values and not force:
+                                            if val in sig.values:
                                                 can.send_signal(testSig, val)
                                                 break
                                         else:
@@ -319,6 +407,7 @@ def main():
                                     msg = 'Invalid signal name or value!'
                                     logging.error(msg)
                         elif s[1] == 'diag':
+                            data = False
                             if len(s) == 6:
                                 data = can.send_diag(s[2], s[3], s[4],
                                                      respData=s[5])
@@ -328,11 +417,7 @@ def main():
                                 data = can.send_diag(s[2], '', s[3])
                             else:
                                 logging.error('Invalid number of arguments!')
-                            if args.network_listen:
-                                if data != False:
-                                    conn.sendall(data)
-                                else:
-                                    conn.sendall('')
+                            reply = data
                         elif s[1] == 'lastfound':
                             if len(s) > 3:
                                 value = ' '.join(s[3:])
@@ -396,11 +481,7 @@ def main():
                             data = can.wait_for(s[1], s[2], s[3])
                         else:
                             logging.error('Invalid number of arguments!')
-                        if  args.network_listen:
-                            if data != False:
-                                conn.sendall(data)
-                            else:
-                                conn.sendall('')
+                        reply = data
                     elif command == 'periodics':
                         if len(s) > 1:
                             if s[1] == 'info':
@@ -430,8 +511,12 @@ def main():
                             logging.error('Invalid log command!')
                 else:
                     print('Invalid command - type \'h\' or \'help\' for options')
-                if args.network_listen:
+            if args.network_listen and conn is not None:
+                _send_reply(conn, reply, framed)
+                if not framed:
+                    # Older clients send one command per connection
                     conn.close()
+                    conn = None
         except EOFError:
             pass
         except KeyboardInterrupt:
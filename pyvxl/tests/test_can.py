@@ -203,6 +203,14 @@ def test_sending_and_stopping_messages(can):  # noqa
     with pytest.raises(TypeError):
         channel.send_new_message(0x55555, None)
 
+    periodics = can.print_periodics()
+    assert msg1 in periodics and msg2 in periodics and msg4 in periodics
+    assert msg3 not in periodics
+    assert can.print_periodics(info=True, search_for='msg1') == [msg1]
+    assert can.print_periodics(search_for=0xABC) == [msg4]
+    # Signal names are searched too
+    assert can.print_periodics(search_for='msg1_sig1') == [msg1]
+
     channel.stop_message('msg1')
     assert msg1.sending is False
 
@@ -248,3 +256,21 @@ def test_queuing(can):  # noqa
     assert isinstance(time, float)
     assert msg_data == msg3_data
     can.stop_logging()
+
+
+def test_unlimited_queue(can):  # noqa
+    # A queue_size of 0 doesn't limit the queue, like queue.Queue(0)
+    channels = list(can.channels.values())
+    if len(channels) < 2:
+        dbc_path = path.join(path.dirname(path.realpath(__file__)),
+                             'test_dbc.dbc')
+        channels.append(can.add_channel(channels[0].channel - 1,
+                                        db=dbc_path))
+    rx_channel, tx_channel = channels[:2]
+    rx_channel.start_queue('msg3', queue_size=0)
+    for _ in range(3):
+        tx_channel.send_message('msg3')
+    for _ in range(3):
+        _, msg_data = rx_channel.dequeue_msg('msg3', timeout=200)
+        assert msg_data is not None
+    rx_channel.stop_queue('msg3')
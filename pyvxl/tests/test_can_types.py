@@ -27,3 +27,92 @@ def test_signals(db):  # noqa
     assert sig.val == 4206
     assert sig.raw_val == 0x6E10000000000000
     assert sig.msg.data == '6E10000000000000'
+
+
+def test_message_data(db):  # noqa
+    msg = db.get_message('msg3')
+    sig = db.get_signal('msg3_sig1')
+    # Bits outside of all signals are dropped
+    msg.data = 'FFFFFFFFFFFFFFFF'
+    assert msg.data == '0000FFFF00000000'
+    assert sig.raw_val == 0xFFFF
+    assert msg.raw_data == bytes.fromhex('0000FFFF00000000')
+    sig.raw_val = 0x1234
+    assert msg.data == '0000123400000000'
+    # The cached bytes follow signal changes
+    assert msg.raw_data == bytes.fromhex('0000123400000000')
+    # Changing one signal leaves the others alone
+    msg = db.get_message('msg2')
+    db.get_signal('msg2_sig3').raw_val = 3
+    db.get_signal('msg2_sig2').raw_val = 1
+    assert msg.data == '000000010000000C'
+    db.get_signal('msg2_sig3').raw_val = 0
+    assert msg.data == '0000000100000000'
+    # Shrinking the dlc drops the trailing bytes from both views
+    msg = db.add_message(0x7F0, '0102030405060708', 0, 'no_signals')
+    msg.dlc = 4
+    assert msg.data == '05060708'
+    assert msg.raw_data == bytes.fromhex(msg.data)
+
+
+def test_get_message(db):  # noqa
+    msg = db.get_message('msg3')
+    assert msg is db.get_message(0x456)
+    # Repeated and mixed case lookups return the same message
+    assert msg is db.get_message('MSG3')
+    assert msg is db.get_message('msg3')
+    with pytest.raises(ValueError):
+        db.get_message('not_a_message')
+    with pytest.raises(TypeError):
+        db.get_message(None)
+    # ID 0 is valid and the extended ID bit is ignored
+    zero = db.add_message(0, '00', 0, 'zero')
+    assert zero is db.get_message(0)
+    assert msg is db.get_message(0x80000456)
+
+
+def test_dbc_reimport(db):  # noqa
+    other = Database(db.path)
+    assert other.messages.keys() == db.messages.keys()
+    # Databases imported from the same file must not share messages
+    msg = db.get_message('msg3')
+    assert msg is not other.get_message('msg3')
+    sig = db.get_signal('msg3_sig1')
+    sig.val = 1
+    assert other.get_signal('msg3_sig1').raw_val != sig.raw_val
+    # Imports after clearing the cache parse the file again
+    Database.clear_dbc_cache()
+    reparsed = Database(db.path)
+    assert reparsed.messages.keys() == db.messages.keys()
+
+
+def test_find_signals(db):  # noqa
+    assert db.find_signals('msg3_') == [db.get_signal('msg3_sig1')]
+    sigs = db.find_signals('SIG1')
+    assert db.get_signal('msg1_sig1') in sigs
+    assert db.get_signal('msg2_sig1') in sigs
+    assert db.find_signals('not_a_signal') == []
+    with pytest.raises(TypeError):
+        db.find_signals(None)
+
+
+def test_find_messages(db):  # noqa
+    msg3 = db.get_message('msg3')
+    assert db.find_messages(0x456) == [msg3]
+    assert db.find_messages(0x80000456) == [msg3]
+    assert db.find_messages(0x7FF) == []
+    assert db.find_messages('MSG3') == [msg3]
+    assert msg3 in db.find_messages('msg')
+    with pytest.raises(TypeError):
+        db.find_messages(None)
+
+
+def test_signal_named_values(db):  # noqa
+    sig = db.get_signal('msg1_sig3')
+    sig.val = 'run'
+    assert sig.val == 'Run'
+    assert sig.raw_val == 2
+    sig.val = 'START REQUEST'
+    assert sig.raw_val == 3
+    with pytest.raises(ValueError):
+        sig.val = 'not_a_value'
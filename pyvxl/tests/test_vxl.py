@@ -24,6 +24,9 @@ def test_init():  # noqa
         VxlCan(baud='five hundred thousand')
     vxl = VxlCan(channel=None)
     assert vxl.channels == {}
+    # Channels can only be changed through add_channel and remove_channel
+    with pytest.raises(TypeError):
+        vxl.channels[1] = None
     assert vxl.bus_type == BUS_TYPE_CAN
 
 
@@ -145,6 +148,26 @@ def test_receive(vxl):  # noqa
                 assert data == tx_data
 
 
+def test_receive_returns_new_events(vxl):  # noqa
+    channel = list(vxl.channels.keys())[0]
+    XL_CAN_EV_TAG_TX_OK = 0x0404  # noqa
+    vxl.flush_queues()
+    msg_ids = [0x100, 0x101, 0x102]
+    for msg_id in msg_ids:
+        assert vxl.send(channel, msg_id, '01')
+    sleep(0.01)
+    # Keep every event; later calls must not overwrite earlier ones
+    events = []
+    rx_event = vxl.receive()
+    while rx_event is not None:
+        events.append(rx_event)
+        rx_event = vxl.receive()
+    tx_ids = [event.tagData.canRxOkMsg.canId for event in events
+              if event.tag == XL_CAN_EV_TAG_TX_OK and
+              event.channelIndex + 1 == channel]
+    assert tx_ids == msg_ids
+
+
 def test_get_rx_queued_length(vxl):  # noqa
     length = vxl.get_rx_queued_length()
     assert isinstance(length, int)
@@ -395,14 +418,75 @@ def test_send_queue_full(vxl, monkeypatch):  # noqa
     def vxl_queue_full(one, two, three, four, five, svar=[False]):  # noqa
         if not svar[0]:
             svar[0] = True
-            return b'XL_ERR_QUEUE_IS_FULL'
-        return b'XL_SUCCESS'
-    monkeypatch.setattr(vxl_file, 'vxl_transmit', vxl_queue_full)
+            return vxl_file.XL_ERR_QUEUE_IS_FULL
+        return vxl_file.XL_SUCCESS
+    monkeypatch.setattr(vxl_file, 'vxl_transmit_raw', vxl_queue_full)
 
     channel = list(vxl.channels.keys())[0]
     assert vxl.send(channel, 0x123, '010203') is True
 
 
+def test_send_many(vxl):  # noqa
+    channel = list(vxl.channels.keys())[0]
+    frames = [(0x100 + i, bytes([i]) * 8, False) for i in range(3)]
+    vxl.flush_queues()
+    assert vxl.send_many(channel, frames)
+    sleep(0.01)
+    XL_CAN_EV_TAG_TX_OK = 0x0404  # noqa
+    received = []
+    rx_event = vxl.receive()
+    while rx_event is not None:
+        if rx_event.tag == XL_CAN_EV_TAG_TX_OK and \
+           rx_event.channelIndex + 1 == channel:
+            rx_msg = rx_event.tagData.canRxOkMsg
+            received.append((rx_msg.canId, bytes(rx_msg.data[:8]), False))
+        rx_event = vxl.receive()
+    assert received == frames
+    assert vxl.send_many(channel, []) is True
+    with pytest.raises(ValueError):
+        vxl.send_many(-1, frames)
+    with pytest.raises(ValueError):
+        vxl.send_many(channel, [(0x123, '00' * 9, False)])
+
+
+def test_send_many_queue_full(vxl, monkeypatch):  # noqa
+    counts = []
+
+    def vxl_queue_full(one, two, three, four, five):  # noqa
+        counts.append(three.value)
+        if len(counts) == 1:
+            # Only the first frame fit
+            four.contents.value = 1
+            return vxl_file.XL_ERR_QUEUE_IS_FULL
+        four.contents.value = three.value
+        return vxl_file.XL_SUCCESS
+    monkeypatch.setattr(vxl_file, 'vxl_transmit_raw', vxl_queue_full)
+
+    channel = list(vxl.channels.keys())[0]
+    frames = [(0x123, '010203', False)] * 3
+    assert vxl.send_many(channel, frames) is True
+    assert counts == [3, 2]
+
+
+def test_send_many_queue_full_all_sent(vxl, monkeypatch):  # noqa
+    counts = []
+
+    def vxl_queue_full(one, two, three, four, five):  # noqa
+        counts.append(three.value)
+        if len(counts) == 1:
+            four.contents.value = 1
+        else:
+            # The queue filled with the last frame, but every frame fit
+            four.contents.value = three.value
+        return vxl_file.XL_ERR_QUEUE_IS_FULL
+    monkeypatch.setattr(vxl_file, 'vxl_transmit_raw', vxl_queue_full)
+
+    channel = list(vxl.channels.keys())[0]
+    frames = [(0x123, '010203', False)] * 3
+    assert vxl.send_many(channel, frames) is True
+    assert counts == [3, 2]
+
+
 def test_get_can_channels(vxl):  # noqa
     if vxl.config.channelCount == 2:
         assert vxl.get_can_channels() == []
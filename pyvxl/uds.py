@@ -9,6 +9,8 @@ from copy import deepcopy
 
 logger = logging.getLogger(__name__)
 
+_hex_byte_pat = re.compile(r'[0-9a-fA-F][0-9a-fA-F]')
+
 
 class UDS:
     """Sends/receives UDS requests compliant with ISO 14229-1:2013."""
@@ -109,9 +111,7 @@ class UDS:
         elif padding.isdecimal():
             num = int(padding)
         else:
-            pat = re.compile(r'[0-9a-fA-F][0-9a-fA-F]')
-            match = pat.match(padding)
-            if not match or (match and match.group(0) != padding):
+            if not _hex_byte_pat.fullmatch(padding):
                 num = -1
             else:
                 num = int(padding, 16)
@@ -146,21 +146,23 @@ class UDS:
         if check_type in ['DID', 'RID']:
             expected_len = 4
             expected_max = 0xFFFF
-            fmt_str = '{:04X}'
         else:
             raise NotImplementedError(f'{check_type} is not implemented')
         if isinstance(data, str):
             if len(data) > expected_len:
                 raise ValueError(f'{check_type} length must be less than or '
                                  f'equal to {expected_len} characters. '
-                                 f'{data:X} is {len(data)} characters long.')
-            data = data.zfill(expected_len)
+                                 f'{data} is {len(data)} characters long.')
+            data = list(bytes.fromhex(data.zfill(expected_len)))
         elif isinstance(data, int) and not isinstance(data, bool):
-            if data > expected_max:
+            if not 0 <= data <= expected_max:
                 raise ValueError(f'{data:X} not in range: 0 <= {check_type} <='
                                  f' 0x{expected_max:X}')
-            data = fmt_str.format(data)
-        return list(bytes.fromhex(data))
+            # Split into bytes directly instead of going through a hex string
+            data = list(data.to_bytes(expected_len // 2, 'big'))
+        else:
+            raise TypeError(f'Expected str or int but got {type(data)}')
+        return data
 
     def _check_data(self, data):
         """Check that data is either a hex string or list of bytes.
@@ -6,29 +6,23 @@ from pyvxl.vxl_functions import vxl_open_driver, vxl_close_driver
 from pyvxl.vxl_functions import vxl_open_port, vxl_close_port, vxl_reset_clock
 from pyvxl.vxl_functions import vxl_activate_channel, vxl_deactivate_channel
 from pyvxl.vxl_functions import vxl_get_driver_config
-from pyvxl.vxl_functions import vxl_transmit, vxl_receive
+from pyvxl.vxl_functions import vxl_transmit_raw, vxl_receive
 from pyvxl.vxl_functions import vxl_get_receive_queue_size, vxl_get_sync_time
 from pyvxl.vxl_functions import vxl_request_chip_state, vxl_set_fd_conf
 from pyvxl.vxl_functions import vxl_flush_tx_queue, vxl_flush_rx_queue
 from pyvxl.vxl_types import vxl_driver_config_type, vxl_can_rx_event
 from pyvxl.vxl_types import vxl_can_tx_event, vxl_can_fd_conf
 
-import os
 import logging
 from time import sleep
-from ctypes import cdll, c_uint, c_int, c_ubyte, c_ulong, cast
-from ctypes import c_ushort, c_ulonglong, pointer, sizeof, POINTER
+from types import MappingProxyType
+from threading import Lock
+from ctypes import c_uint, c_int, c_ubyte, c_ulong, memmove
+from ctypes import c_ushort, c_ulonglong, pointer, byref, sizeof
 from ctypes import c_long, create_string_buffer
 
 logger = logging.getLogger(__name__)
 
-# Grab the c library and some functions from it
-if os.name == 'nt':
-    libc = cdll.msvcrt
-printf = libc.printf
-strncpy = libc.strncpy
-memset = libc.memset
-
 OUTPUT_MODE_SILENT = 0
 OUTPUT_MODE_NORMAL = 1
 
@@ -50,6 +44,10 @@ BUS_TYPE_NAMES = {BUS_TYPE_CAN: 'CAN', BUS_TYPE_LIN: 'LIN'}
 INTERFACE_VERSION_V3 = 3  # CAN, LIN, DAIO and K-Line
 INTERFACE_VERSION_V4 = 4  # MOST,CAN FD, Ethernet, FlexRay and ARINC429
 
+# XLstatus codes from vxlapi.h
+XL_SUCCESS = 0
+XL_ERR_QUEUE_IS_FULL = 11
+
 # Extended data length. This flag is needed when sending more then 8 bytes or
 # of the BRS flag is used.
 XL_CAN_TXMSG_FLAG_EDL = 0x0001
@@ -63,6 +61,23 @@ XL_CAN_TXMSG_FLAG_HIGHPRIO = 0x0080
 # Generates a wake up message.
 XL_CAN_TXMSG_FLAG_WAKEUP = 0x0200
 
+# Largest number of frames VxlCan.send_many hands to the driver per call.
+TX_BATCH_MAX = 64
+# Longest sleep between transmit retries while the driver queue is full.
+TX_RETRY_MAX_S = 0.001
+# CAN FD dlc codes for payloads longer than 8 bytes
+FD_DLC_CODES = {12: 9, 16: 10, 20: 11, 24: 12, 32: 13, 48: 14, 64: 15}
+
+
+def _next_tx_backoff(backoff):
+    """Return the next sleep for a full transmit queue.
+
+    Starts at 100us after the first yield and doubles up to TX_RETRY_MAX_S.
+    """
+    if not backoff:
+        return 0.0001
+    return min(backoff * 2, TX_RETRY_MAX_S)
+
 
 class Vxl:
     """Base class for connecting to the vxlAPI.dll.
@@ -75,9 +90,14 @@ class Vxl:
         self.__bus_type = None
         self.__access_mask = c_ulonglong(0)
         self.__channels = {}
+        self.__channels_view = MappingProxyType(self.__channels)
+        # Reused by every call to receive
+        self.__rx_event = vxl_can_rx_event()
+        self.__rx_event_ptr = pointer(self.__rx_event)
         self.rx_queue_size = rx_queue_size
         vxl_open_driver()
-        self.update_config()
+        # The driver was just opened so it already sees all connected hardware
+        self.update_config(reopen=False)
 
     def __del__(self):
         """."""
@@ -96,13 +116,11 @@ class Vxl:
             raise AssertionError('No channels to open! Add channels with '
                                  'add_channel before calling open_port.')
         port = c_long(-1)
-        ph_ptr = pointer(port)
         app_name = create_string_buffer(prog_name.encode('utf-8'), 32)
         perm_mask = c_ulonglong(self.access_mask.value)
-        perm_ptr = pointer(perm_mask)
-        if not vxl_open_port(ph_ptr, app_name, self.access_mask, perm_ptr,
-                             self.rx_queue_size, INTERFACE_VERSION_V4,
-                             self.bus_type):
+        if not vxl_open_port(byref(port), app_name, self.access_mask,
+                             byref(perm_mask), self.rx_queue_size,
+                             INTERFACE_VERSION_V4, self.bus_type):
             raise AssertionError(f'Failed opening port for {prog_name}')
         # Set which channels we have init access on
         for channel in self.__channels.values():
@@ -169,20 +187,37 @@ class Vxl:
         """Get the driver configuration."""
         return self.__config
 
-    def update_config(self):
-        """Update the list of connected hardware."""
-        vxl_close_driver()
-        vxl_open_driver()
-        drv_config_ptr = pointer(vxl_driver_config_type())
-        vxl_get_driver_config(drv_config_ptr)
-        self.__config = drv_config_ptr.contents
+    def update_config(self, reopen=True):
+        """Update the list of connected hardware.
+
+        Args:
+            reopen: If True, the driver is closed and reopened first so
+                    hardware connected since it was opened is found.
+        """
+        if reopen:
+            vxl_close_driver()
+            vxl_open_driver()
+        config = vxl_driver_config_type()
+        vxl_get_driver_config(byref(config))
+        self.__config = config
+        # The version only changes with the config so format it once here
+        ver = self.config.dllVersion
+        major = ((ver & 0xFF000000) >> 24)
+        minor = ((ver & 0xFF0000) >> 16)
+        build = ver & 0xFFFF
+        self.__dll_version = f'{major}.{minor}.{build}'
         logger.debug(f'Vxl Channels: {self.config.channelCount}')
 
     @property
     def channels(self):
-        """A dictionary of channels added to Vxl sorted by channel number."""
-        # Return a copy to prevent external modification
-        return dict(self.__channels)
+        """A read-only mapping of channels added to Vxl by channel number.
+
+        This is a live view, not a copy: it reflects later calls to
+        add_channel and remove_channel. It isn't thread-safe; iterating it
+        while another thread adds or removes a channel raises RuntimeError.
+        Use dict(vxl.channels) for a snapshot in that case.
+        """
+        return self.__channels_view
 
     def add_channel(self, **kwargs):
         """Add a channel."""
@@ -211,15 +246,25 @@ class Vxl:
         process.
 
         Returns:
-            A string if data is received, otherwise None.
+            A new vxl_can_rx_event if data is received, otherwise None.
+        """
+        rx_event = self._receive_shared()
+        if rx_event is not None:
+            rx_event = vxl_can_rx_event.from_buffer_copy(rx_event)
+        return rx_event
+
+    def _receive_shared(self):
+        """Receive a message into an event that is reused by every call.
+
+        This is meant to be an internal function for pyvxl only. The returned
+        event is overwritten by the next call so copy anything needed out of
+        it first.
         """
         if self.port is None:
             raise AssertionError('Port not opened! Call open_port first.')
-        rx_event = vxl_can_rx_event()
-        rx_event_ptr = pointer(rx_event)
         response = None
-        if vxl_receive(self.port, rx_event_ptr):
-            response = rx_event
+        if vxl_receive(self.port, self.__rx_event_ptr):
+            response = self.__rx_event
         return response
 
     def get_rx_queued_length(self):
@@ -227,9 +272,8 @@ class Vxl:
         if self.port is None:
             raise AssertionError('Port not opened! Call open_port first.')
         size = c_int(0)
-        size_ptr = pointer(size)
-        logger.debug(vxl_get_receive_queue_size(self.port, size_ptr))
-        logger.debug(f'Rx Queued Items: {size.value}')
+        logger.debug(vxl_get_receive_queue_size(self.port, byref(size)))
+        logger.debug('Rx Queued Items: %s', size.value)
         return size.value
 
     def reset_clock(self):
@@ -240,44 +284,42 @@ class Vxl:
 
     def get_dll_version(self):
         """Get the version of the vxlAPI.dll."""
-        ver = self.config.dllVersion
-        major = ((ver & 0xFF000000) >> 24)
-        minor = ((ver & 0xFF0000) >> 16)
-        build = ver & 0xFFFF
-        return f'{major}.{minor}.{build}'
+        return self.__dll_version
 
     def get_time(self):
         """Get the time from the dll."""
         time = c_ulonglong(0)
-        time_ptr = pointer(time)
-        logger.debug(vxl_get_sync_time(self.port, time_ptr))
-        logger.debug(f'Time: {time.value}')
+        logger.debug(vxl_get_sync_time(self.port, byref(time)))
+        logger.debug('Time: %s', time.value)
         return time.value
 
     def print_config(self, debug=False):
         """Print the current hardware configuration."""
         found_piggy = False
-        print('----------------------------------------------------------')
-        print(f'- {self.config.channelCount: 2} channels       Hardware '
-              'Configuration              -')
-        print('----------------------------------------------------------')
+        border = '----------------------------------------------------------'
+        # Build the whole table and print it once
+        lines = [border,
+                 f'- {self.config.channelCount: 2} channels       Hardware '
+                 'Configuration              -',
+                 border]
         for i in range(self.config.channelCount):
             channel = self.config.channel[i]
             if debug:
-                print(f'- Channel Index: {channel.channelIndex}, ', end='')
-                print(f' Channel Mask: {channel.channelMask}, ', end='')
+                line = (f'- Channel Index: {channel.channelIndex}, '
+                        f' Channel Mask: {channel.channelMask}, ')
             else:
-                print(f'- Channel: {channel.channelIndex + 1}, ', end='')
+                line = f'- Channel: {channel.channelIndex + 1}, '
             name = channel.name.decode('utf-8')
-            print(f' {name: >16}, ', end='')
+            line += f' {name: >16}, '
             if channel.transceiverType != 0:
                 found_piggy = True
                 name = channel.transceiverName.decode('utf-8')
-                print(f'{name: >13} -')
+                line += f'{name: >13} -'
             else:
-                print('    no Cab!           -')
-
-        print('----------------------------------------------------------')
+                line += '    no Cab!           -'
+            lines.append(line)
+        lines.append(border)
+        print('\n'.join(lines))
         if not found_piggy:
             logger.info('Virtual channels only!')
             return False
@@ -523,7 +565,7 @@ class VxlChannel:
             raise AssertionError('Port not opened! Call open_port first.')
         if self.init_access:
             if not vxl_set_fd_conf(self.vxl.port, self.mask,
-                                   pointer(self.fd_conf)):
+                                   byref(self.fd_conf)):
                 raise AssertionError('Failed setting the CAN FD configuration '
                                      f'for {self}')
             if not vxl_flush_tx_queue(self.vxl.port, self.mask):
@@ -557,6 +599,21 @@ class VxlCan(Vxl):
         else:
             super().__init__()
         self.bus_type = BUS_TYPE_CAN
+        # Reused by send instead of allocating a new event for every frame.
+        # Both the main thread and pyvxl.can.TransmitThread call send so the
+        # buffer is guarded by __tx_lock.
+        self.__tx_lock = Lock()
+        self.__tx_event = vxl_can_tx_event()
+        self.__tx_event.tag = c_ushort(0x0440)
+        self.__tx_event_ptr = pointer(self.__tx_event)
+        self.__tx_count = c_uint(1)
+        self.__tx_sent = c_uint(0)
+        self.__tx_sent_ptr = pointer(self.__tx_sent)
+        # Event array used by send_many; shares __tx_lock with send.
+        self.__tx_batch = (vxl_can_tx_event * TX_BATCH_MAX)()
+        for event in self.__tx_batch:
+            event.tag = c_ushort(0x0440)
+        self.__tx_batch_count = c_uint(0)
         if channel is not None:
             self.add_channel(num=channel, **kwargs)
 
@@ -568,7 +625,7 @@ class VxlCan(Vxl):
 
     def __str__(self):
         """Return a string representation of this channel."""
-        return (f'VxlCan({self.channels})')
+        return (f'VxlCan({dict(self.channels)})')
 
     @property
     def started(self):
@@ -609,66 +666,130 @@ class VxlCan(Vxl):
     def send(self, channel, msg_id, msg_data, brs=False):
         """Send a CAN message.
 
-        Type checking on input parameters is intentionally left out to increase
-        transmit speed.
+        msg_data can be bytes or a hexadecimal string. Bytes are copied into
+        the event as is; strings are converted with bytes.fromhex first, so
+        pass bytes (e.g. Message.raw_data) when sending often. Type checking
+        on input parameters is intentionally left out to increase transmit
+        speed.
         """
-        status = b'XL_ERR_QUEUE_IS_FULL'
-        if channel not in self.channels:
+        status = XL_ERR_QUEUE_IS_FULL
+        # Look the channel up only once
+        vxl_channel = self.channels.get(channel)
+        if vxl_channel is None:
             raise ValueError(f'{channel} has not been added through '
                              'add_channel.')
-        dlc = int(len(msg_data) / 2)
-        msg_data = bytes.fromhex(msg_data)
-        # Retry transmitting until the queue isn't full
-        while status == b'XL_ERR_QUEUE_IS_FULL':
-            xl_event = vxl_can_tx_event()
-            memset(pointer(xl_event), 0, sizeof(xl_event))
-            xl_event.tag = c_ushort(0x0440)
-            if msg_id > 0x7FF:
-                xl_event.tagData.canMsg.canId = c_ulong(msg_id | 0x80000000)
-            else:
-                xl_event.tagData.canMsg.canId = c_ulong(msg_id)
-
-            if brs:
-                fd_flags = XL_CAN_TXMSG_FLAG_EDL | XL_CAN_TXMSG_FLAG_BRS
-            else:
-                fd_flags = 0
-            if dlc > 8:
-                fd_flags |= XL_CAN_TXMSG_FLAG_EDL
-                dlc_map = {12: 9, 16: 10, 20: 11, 24: 12, 32: 13, 48: 14,
-                           64: 15}
-                if dlc not in dlc_map:
-                    raise ValueError(f'{dlc}s larger than 8 must be one of '
-                                     f'these values: {dlc_map.values()}')
-                dlc = dlc_map[dlc]
-            xl_event.tagData.canMsg.msgFlags = c_uint(fd_flags)
-            xl_event.tagData.canMsg.dlc = c_ubyte(dlc)
-            # Converting from a string to a c_ubyte array
-            data = create_string_buffer(msg_data, 64)
-            tmp_ptr = pointer(data)
-            data_ptr = cast(tmp_ptr, POINTER(c_ubyte * 64))
-            xl_event.tagData.canMsg.data = data_ptr.contents
-            msg_count = c_uint(1)
-            msg_sent = c_uint(0)
-            msg_sent_ptr = pointer(msg_sent)
-            event_ptr = pointer(xl_event)
-            status = vxl_transmit(self.port, self.channels[channel].mask,
-                                  msg_count, msg_sent_ptr, event_ptr)
-            if status == b'XL_ERR_QUEUE_IS_FULL':
-                # Let other threads run. Before this sleep was added, I was
-                # seeing 400+ loops in this function until the queue was no
-                # longer full. After adding it, there was at most one extra
-                # loop. I think this thread is starving something important
-                # and the sleep allows it to catch up.
-                sleep(0.001)
-
-        return True if status == b'XL_SUCCESS' else False
-
-    def get_can_channels(self, include_virtual=False):
-        """Return a list of connected CAN channels."""
+        mask = vxl_channel.mask
+        with self.__tx_lock:
+            self.__set_tx_msg(self.__tx_event.tagData.canMsg, msg_id,
+                              msg_data, brs)
+            # Retry transmitting until the queue isn't full
+            backoff = 0
+            while status == XL_ERR_QUEUE_IS_FULL:
+                status = vxl_transmit_raw(self.port, mask, self.__tx_count,
+                                          self.__tx_sent_ptr,
+                                          self.__tx_event_ptr)
+                if status == XL_ERR_QUEUE_IS_FULL:
+                    # Let other threads run. Before this sleep was added, I
+                    # was seeing 400+ loops in this function until the queue
+                    # was no longer full. After adding it, there was at most
+                    # one extra loop. I think this thread is starving
+                    # something important and the sleep allows it to catch
+                    # up. The first retry only yields so a queue that is
+                    # nearly drained doesn't cost a full millisecond.
+                    sleep(backoff)
+                    backoff = _next_tx_backoff(backoff)
+
+        return True if status == XL_SUCCESS else False
+
+    def send_many(self, channel, frames):
+        """Send several CAN messages on one channel.
+
+        frames is a sequence of (msg_id, msg_data, brs) tuples. They are
+        handed to the driver TX_BATCH_MAX at a time instead of once per
+        frame. Returns True if every frame was queued.
+        """
+        vxl_channel = self.channels.get(channel)
+        if vxl_channel is None:
+            raise ValueError(f'{channel} has not been added through '
+                             'add_channel.')
+        mask = vxl_channel.mask
+        event_size = sizeof(vxl_can_tx_event)
+        status = XL_SUCCESS
+        with self.__tx_lock:
+            for start in range(0, len(frames), TX_BATCH_MAX):
+                count = 0
+                for msg_id, msg_data, brs in frames[start:start +
+                                                    TX_BATCH_MAX]:
+                    self.__set_tx_msg(self.__tx_batch[count].tagData.canMsg,
+                                      msg_id, msg_data, brs)
+                    count += 1
+                sent = 0
+                backoff = 0
+                while sent < count:
+                    self.__tx_batch_count.value = count - sent
+                    status = vxl_transmit_raw(self.port, mask,
+                                              self.__tx_batch_count,
+                                              self.__tx_sent_ptr,
+                                              byref(self.__tx_batch,
+                                                    sent * event_size))
+                    if status != XL_ERR_QUEUE_IS_FULL:
+                        break
+                    # The driver reports how many frames fit before the
+                    # queue filled; resend only the rest. See send.
+                    sent += self.__tx_sent.value
+                    if sent >= count:
+                        # The queue filled with the last frame; all of them
+                        # were still queued
+                        status = XL_SUCCESS
+                        break
+                    sleep(backoff)
+                    backoff = _next_tx_backoff(backoff)
+                if status != XL_SUCCESS:
+                    break
+
+        return True if status == XL_SUCCESS else False
+
+    @staticmethod
+    def __set_tx_msg(can_msg, msg_id, msg_data, brs):
+        """Fill a transmit event's canMsg for send and send_many.
+
+        msg_data can be bytes or a hexadecimal string.
+        """
+        if isinstance(msg_data, str):
+            msg_data = bytes.fromhex(msg_data)
+        dlc = len(msg_data)
+        if msg_id > 0x7FF:
+            msg_id |= 0x80000000
+        if brs:
+            fd_flags = XL_CAN_TXMSG_FLAG_EDL | XL_CAN_TXMSG_FLAG_BRS
+        else:
+            fd_flags = 0
+        if dlc > 8:
+            fd_flags |= XL_CAN_TXMSG_FLAG_EDL
+            code = FD_DLC_CODES.get(dlc)
+            if code is None:
+                raise ValueError(f'{dlc}s larger than 8 must be one of '
+                                 f'these values: {list(FD_DLC_CODES)}')
+            dlc = code
+        can_msg.canId = c_ulong(msg_id)
+        can_msg.msgFlags = c_uint(fd_flags)
+        can_msg.dlc = c_ubyte(dlc)
+        # Copy straight into the event's c_ubyte array. Bytes past dlc
+        # are left over from previous frames but aren't transmitted.
+        memmove(can_msg.data, msg_data, len(msg_data))
+
+    def get_can_channels(self, include_virtual=False, reopen=True):
+        """Return a list of connected CAN channels.
+
+        Args:
+            include_virtual: If True, virtual channels are included.
+            reopen: Passed to update_config. Set to False when the driver
+                    was just opened and can't have missed new hardware.
+        """
         can_channels = []
         # Update driver config in case more channels were
         # connected since instantiating this object.
-        self.update_config()
+        self.update_config(reopen=reopen)
         # Search through all channels
         for i in range(self.config.channelCount):
             channel = self.config.channel[i]
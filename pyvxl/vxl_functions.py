@@ -47,50 +47,52 @@ getEventStr.restype = c_char_p
 def vxl_open_driver(*args):
     """Connect to the vxlAPI dll."""
     status = getError(vxDLL.xlOpenDriver(*args))
-    logger.debug('{0}: {1}'.format('xLOpenDriver', status))
+    logger.debug('%s: %s', 'xLOpenDriver', status)
     return True if status == b'XL_SUCCESS' else False
 
 
 def vxl_close_driver(*args):
     """Disconnect from the vxlAPI dll."""
     status = getError(vxDLL.xlCloseDriver(*args))
-    logger.debug('{0}: {1}'.format('xLCloseDriver', status))
+    logger.debug('%s: %s', 'xLCloseDriver', status)
     return True if status == b'XL_SUCCESS' else False
 
 
 def vxl_open_port(*args):
     """Open a port."""
     status = getError(vxDLL.xlOpenPort(*args))
-    logger.debug('{0}: {1}'.format('xLOpenPort', status))
+    logger.debug('%s: %s', 'xLOpenPort', status)
     return True if status == b'XL_SUCCESS' else False
 
 
 def vxl_close_port(*args):
     """Close a port."""
     status = getError(vxDLL.xlClosePort(*args))
-    logger.debug('{0}: {1}'.format('xLClosePort', status))
+    logger.debug('%s: %s', 'xLClosePort', status)
     return True if status == b'XL_SUCCESS' else False
 
 
 def vxl_activate_channel(*args):
     """Activate a channel."""
     status = getError(vxDLL.xlActivateChannel(*args))
-    logger.debug('{0}: {1}'.format('xlActivateChannel', status))
+    logger.debug('%s: %s', 'xlActivateChannel', status)
     return True if status == b'XL_SUCCESS' else False
 
 
 def vxl_deactivate_channel(*args):
     """Deactivate a channel."""
     status = getError(vxDLL.xlDeactivateChannel(*args))
-    logger.debug('{0}: {1}'.format('xlDeactivateChannel', status))
+    logger.debug('%s: %s', 'xlDeactivateChannel', status)
     return True if status == b'XL_SUCCESS' else False
 
 
-def vxl_transmit(*args):
-    """Transmit a CAN message."""
-    status = getError(vxDLL.xlCanTransmitEx(*args))
-    # logger.debug('{0}: {1}'.format('xlCanTransmitEx', status))
-    return status
+def vxl_transmit_raw(*args):
+    """Transmit a CAN message and return the numeric XLstatus.
+
+    The status isn't converted with xlGetErrorString since this is called
+    for every transmitted frame.
+    """
+    return vxDLL.xlCanTransmitEx(*args)
 
 
 def vxl_receive(*args):
@@ -106,21 +108,21 @@ def vxl_receive(*args):
 def vxl_get_receive_queue_size(*args):
     """Get the number of items in the receive queue."""
     status = getError(vxDLL.xlGetReceiveQueueLevel(*args))
-    logger.debug('{0}: {1}'.format('xlGetReceiveQueueLevel', status))
+    logger.debug('%s: %s', 'xlGetReceiveQueueLevel', status)
     return True if status == b'XL_SUCCESS' else False
 
 
 def vxl_get_driver_config(*args):
     """Get the driver configuration."""
     status = getError(vxDLL.xlGetDriverConfig(*args))
-    logger.debug('{0}: {1}'.format('xlGetDriverConfig', status))
+    logger.debug('%s: %s', 'xlGetDriverConfig', status)
     return True if status == b'XL_SUCCESS' else False
 
 
 def vxl_get_sync_time(*args):
     """Get the driver sync time in nanoseconds."""
     status = getError(vxDLL.xlGetSyncTime(*args))
-    logger.debug('{0}: {1}'.format('xlGetSyncTime', status))
+    logger.debug('%s: %s', 'xlGetSyncTime', status)
     return True if status == b'XL_SUCCESS' else False
 
 
@@ -132,42 +134,42 @@ def vxl_get_event_str(*args):
 def vxl_set_baudrate(*args):
     """Set the baudrate."""
     status = getError(vxDLL.xlCanSetChannelBitrate(*args))
-    logger.debug('{0}: {1}'.format('xlCanSetChannelBitrate', status))
+    logger.debug('%s: %s', 'xlCanSetChannelBitrate', status)
     return True if status == b'XL_SUCCESS' else False
 
 
 def vxl_set_fd_conf(*args):
     """Set the CAN FD configuration."""
     status = getError(vxDLL.xlCanFdSetConfiguration(*args))
-    logger.debug('{0}: {1}'.format('xlCanFdSetConfiguration', status))
+    logger.debug('%s: %s', 'xlCanFdSetConfiguration', status)
     return True if status == b'XL_SUCCESS' else False
 
 
 def vxl_set_notification(*args):
     """Set a notification."""
     status = getError(vxDLL.xlSetNotification(*args))
-    logger.debug('{0}: {1}'.format('xlSetNotification', status))
+    logger.debug('%s: %s', 'xlSetNotification', status)
     return True if status == b'XL_SUCCESS' else False
 
 
 def vxl_set_transceiver(*args):
     """Set CAN related tranceiver settings."""
     status = getError(vxDLL.xlCanSetChannelTransceiver(*args))
-    logger.debug('{0}: {1}'.format('xlCanSetChannelTransceiver', status))
+    logger.debug('%s: %s', 'xlCanSetChannelTransceiver', status)
     return True if status == b'XL_SUCCESS' else False
 
 
 def vxl_set_channel_output(*args):
     """Set CAN channel output to normal or silent."""
     status = getError(vxDLL.xlCanSetChannelOutput(*args))
-    logger.debug('{0}: {1}'.format('xlCanSetChannelOutput', status))
+    logger.debug('%s: %s', 'xlCanSetChannelOutput', status)
     return True if status == b'XL_SUCCESS' else False
 
 
 def vxl_set_channel_mode(*args):
     """Set whether tx/txrq receipts for tx messages are enabled."""
     status = getError(vxDLL.xlCanSetChannelMode(*args))
-    logger.debug('{0}: {1}'.format('xlCanSetChannelMode', status))
+    logger.debug('%s: %s', 'xlCanSetChannelMode', status)
     return True if status == b'XL_SUCCESS' else False
 
 
@@ -176,26 +178,26 @@ def vxl_request_chip_state(*args):
     status = getError(vxDLL.xlCanRequestChipState(*args))
     # Since this causes so much spam during debugging, it should be uncommented
     # temporarily.
-    # logger.debug('{0}: {1}'.format('xlCanRequestChipState', status))
+    # logger.debug('%s: %s', 'xlCanRequestChipState', status)
     return True if status == b'XL_SUCCESS' else False
 
 
 def vxl_flush_tx_queue(*args):
     """Flush the CAN transmit queue."""
     status = getError(vxDLL.xlCanFlushTransmitQueue(*args))
-    logger.debug('{0}: {1}'.format('xlCanFlushTransmitQueue', status))
+    logger.debug('%s: %s', 'xlCanFlushTransmitQueue', status)
     return True if status == b'XL_SUCCESS' else False
 
 
 def vxl_flush_rx_queue(*args):
     """Flush the receive queue."""
     status = getError(vxDLL.xlFlushReceiveQueue(*args))
-    logger.debug('{0}: {1}'.format('xlFlushReceiveQueue', status))
+    logger.debug('%s: %s', 'xlFlushReceiveQueue', status)
     return True if status == b'XL_SUCCESS' else False
 
 
 def vxl_reset_clock(*args):
     """Reset the clock."""
     status = getError(vxDLL.xlResetClock(*args))
-    logger.debug('{0}: {1}'.format('xlResetClock', status))
+    logger.debug('%s: %s', 'xlResetClock', status)
     return True if status == b'XL_SUCCESS' else False